@@ -1,8 +1,14 @@
 # ExcelExporter.py
-import openpyxl
-from openpyxl.styles import PatternFill
 import os
 
+try:
+    import xlsxwriter
+except ImportError:              # fall back to openpyxl's streaming (write-only) workbook
+    xlsxwriter = None
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill
+
 BLOB_BASE_URL = "https://images202503.blob.core.windows.net/images/Pearson/Maths/"
 
 # Columns A–Y matching the database template exactly
@@ -42,7 +48,12 @@ GREEN_COLUMNS = {
     "part_image",       # N
 }
 
-GREEN_FILL = PatternFill(start_color="D9EAD3", end_color="D9EAD3", fill_type="solid")
+GREEN_INDEXES = frozenset(i for i, col in enumerate(COLUMNS) if col in GREEN_COLUMNS)
+
+GREEN_BG = "#D9EAD3"
+if xlsxwriter is None:
+    # 8-char ARGB: a bare 6-char RGB is padded to alpha 00 (transparent in some readers)
+    GREEN_FILL = PatternFill(start_color="FFD9EAD3", end_color="FFD9EAD3", fill_type="solid")
 
 
 class ExcelExporter:
@@ -63,48 +74,104 @@ class ExcelExporter:
         question_image_filename  – the full question image (all parts combined);
                                 repeated on every row that belongs to the same question
         """
+        self.rows.append(self._make_row(
+            year, subject, paper, level,
+            question_no, part, sub_part,
+            part_image_filename, question_image_filename,
+        ))
+
+    def add_rows(self, rows):
+        """
+        Add several rows in one call (TaskPipeline hands over one page at a time).
+        Each item is a dict of add_row's keyword arguments.
+        """
+        make_row = self._make_row
+        self.rows.extend(make_row(**row) for row in rows)
+
+    @staticmethod
+    def _make_row(
+        year, subject, paper, level,
+        question_no, part, sub_part,
+        part_image_filename,
+        question_image_filename,
+    ):
         part_image_url     = BLOB_BASE_URL + part_image_filename
         question_image_url = BLOB_BASE_URL + question_image_filename
 
-        row = {col: "" for col in COLUMNS}
-        row["exam"]            = "UK A Level"
-        row["year"]            = year
-        row["subject"]         = subject
-        row["level"]           = level
-        row["paper"]           = paper
-        row["question_no"]     = question_no
-        row["part"]            = part if part else "NA"
-        row["sub_part"]        = sub_part if sub_part else "NA"
-        row["question_image"]  = question_image_url   # column K
-        row["part_image"]      = part_image_url       # column N
-        self.rows.append(row)
+        # Positional tuple aligned with COLUMNS (A–Y)
+        return (
+            "UK A Level",                  # exam
+            year,                          # year
+            subject,                       # subject
+            level,                         # level
+            paper,                         # paper
+            "",                            # section
+            question_no,                   # question_no
+            part if part else "NA",        # part
+            sub_part if sub_part else "NA",  # sub_part
+            "",                            # question_text
+            question_image_url,            # question_image  (column K)
+            "", "",                        # question_total_marks, part_text
+            part_image_url,                # part_image      (column N)
+            "", "", "", "", "", "", "", "", "", "", "",  # O–Y
+        )
+
+    def _column_widths(self):
+        """Auto column widths (single pass over all rows)."""
+        widths = [len(col_name) for col_name in COLUMNS]
+        for row in self.rows:
+            for col_idx, value in enumerate(row):
+                cell_len = len(str(value))
+                if cell_len > widths[col_idx]:
+                    widths[col_idx] = cell_len
+        return [min(width + 2, 60) for width in widths]
 
     def save(self, output_path):
         """Write all rows to Excel once processing is complete."""
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Questions"
+        if xlsxwriter is not None:
+            self._save_xlsxwriter(output_path)
+        else:
+            self._save_openpyxl(output_path)
+        print(f"\nExcel saved: {output_path}  ({len(self.rows)} rows)")
+
+    def _save_xlsxwriter(self, output_path):
+        # constant_memory streams each row to disk as it is written, so rows
+        # must go out strictly in order and column widths have to be set first.
+        wb = xlsxwriter.Workbook(output_path, {"constant_memory": True, "strings_to_urls": False})
+        ws = wb.add_worksheet("Questions")
+        green = wb.add_format({"bg_color": GREEN_BG})
+
+        for col_idx, width in enumerate(self._column_widths()):
+            ws.set_column(col_idx, col_idx, width)
 
         # Header row
-        for col_idx, col_name in enumerate(COLUMNS, start=1):
-            cell = ws.cell(row=1, column=col_idx, value=col_name)
-            if col_name in GREEN_COLUMNS:
-                cell.fill = GREEN_FILL
+        ws.write_row(0, 0, COLUMNS)
+        for col_idx in GREEN_INDEXES:
+            ws.write(0, col_idx, COLUMNS[col_idx], green)
 
         # Data rows
-        for row_idx, row_data in enumerate(self.rows, start=2):
-            for col_idx, col_name in enumerate(COLUMNS, start=1):
-                ws.cell(row=row_idx, column=col_idx, value=row_data.get(col_name, ""))
-
-        # Auto column widths
-        for col_idx, col_name in enumerate(COLUMNS, start=1):
-            max_len = max(
-                len(col_name),
-                max((len(str(row.get(col_name, ""))) for row in self.rows), default=0),
-            )
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = min(
-                max_len + 2, 60
-            )
+        for row_idx, row_data in enumerate(self.rows, start=1):
+            ws.write_row(row_idx, 0, row_data)
+
+        wb.close()
+
+    def _save_openpyxl(self, output_path):
+        # write_only streams rows as they are appended instead of keeping a Cell grid;
+        # styled header cells need the WriteOnlyCell wrapper.
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Questions")
+
+        for col_idx, width in enumerate(self._column_widths(), start=1):
+            ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = width
+
+        # Header row
+        header = [WriteOnlyCell(ws, value=col_name) for col_name in COLUMNS]
+        for col_idx in GREEN_INDEXES:
+            header[col_idx].fill = GREEN_FILL
+        ws.append(header)
+
+        # Data rows
+        for row_data in self.rows:
+            ws.append(row_data)
 
         wb.save(output_path)
-        print(f"\nExcel saved: {output_path}  ({len(self.rows)} rows)")
@@ -1,16 +1,219 @@
 # ImageSnipper.py
+import io
+import math
+import os
+import threading
+from multiprocessing import util
+import numpy as np
 import pymupdf
-import pytesseract 
 from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Crop + PNG encode run through Pillow; pillow-simd can be installed as a drop-in
+# replacement for faster crop/encode kernels (see README).
+
+ZOOM = 2    # Render scale, used to increase the resolution of the output images
+
+# Output format -> (Pillow format, save options). PNG at zlib level 1: several times faster
+# to encode than the default level 6 for ~20% larger files; JPEG for smaller colour pages.
+SAVE_OPTIONS = {
+    "png": ("PNG",  {"optimize": False, "compress_level": 1}),
+    "jpg": ("JPEG", {"quality": 85}),
+}
+
+# Documents opened inside each worker process, keyed by PDF path (reused across pages)
+_worker_docs = {}
+_encode_pool = None     # per-process encoder threads (Pillow releases the GIL while encoding)
+_writer      = None     # per-process _WriterPool
+
+
+def _encode(pixels, output_format):
+    pil_format, options = SAVE_OPTIONS[output_format]
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, pil_format, **options)
+    return buf.getvalue()
+
+
+class _WriterPool:
+    """Writes encoded files on a few threads; at most max_pending writes are queued at once."""
+
+    def __init__(self, max_workers=4, max_pending=8):
+        self._pool    = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots   = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        # Output directory -> open fd (POSIX only); files are created relative to it,
+        # so the directory path is resolved once instead of once per crop
+        self._dir_fds = {} if os.open in os.supports_dir_fd else None
+
+    @staticmethod
+    def _write(output_path, data, dir_fd=None):
+        if dir_fd is None:
+            with open(output_path, "wb") as f:
+                f.write(data)
+        else:
+            fd = os.open(os.path.basename(output_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666, dir_fd=dir_fd)
+            with open(fd, "wb") as f:
+                f.write(data)
+        return output_path
+
+    def _dir_fd(self, output_path):
+        if self._dir_fds is None:
+            return None
+        directory = os.path.dirname(output_path) or "."
+        dir_fd = self._dir_fds.get(directory)
+        if dir_fd is None:
+            dir_fd = self._dir_fds[directory] = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        return dir_fd
+
+    def submit(self, output_path, data):
+        self._slots.acquire()                       # back-pressure on the encoder
+        future = self._pool.submit(self._write, output_path, data, self._dir_fd(output_path))
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def flush(self):
+        """Block until every submitted write is on disk; re-raises the first write error."""
+        futures, self._futures = self._futures, []
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Finish pending writes, stop the threads and close the cached directory fds."""
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown()
+            dir_fds, self._dir_fds = self._dir_fds, ({} if self._dir_fds is not None else None)
+            for dir_fd in (dir_fds or {}).values():
+                os.close(dir_fd)
+
+
+def _render_page_crops(pdf_path, page_no, crops, output_format="png"):
+    """Render-worker entry point: opens the PDF once per process, then renders like _render_crops."""
+    doc = _worker_docs.get(pdf_path)
+    if doc is None:
+        doc = _worker_docs[pdf_path] = pymupdf.open(pdf_path)
+
+    global _encode_pool, _writer
+    if _encode_pool is None:
+        _encode_pool = ThreadPoolExecutor(max_workers=2)   # small: several worker processes share the cores
+        _writer      = _WriterPool()
+        # Worker processes live until the pool shuts down; close the writer (and its
+        # directory fds) on the way out. multiprocessing runs these at process exit.
+        util.Finalize(_writer, _writer.close, exitpriority=10)
+
+    return _render_crops(doc[page_no], crops, output_format, _encode_pool, _writer)
+
+
+def _render_crops(page, crops, output_format, encode_pool, writer):
+    """Render page once and save every (rect, output_path) crop; encode_pool=None encodes inline."""
+    # Stage 1: rasterize the whole page once
+    # samples_mv is a view on the pixmap buffer: no copy of the (large) page image;
+    # pix must stay alive until every crop is encoded.
+    # alpha=False/RGB stated explicitly: 3 bytes per pixel, no alpha channel to carry or drop
+    # (JPEG can't store one), and fromarray gets a plain RGB array
+    pix    = page.get_pixmap(matrix=pymupdf.Matrix(ZOOM, ZOOM), colorspace=pymupdf.csRGB, alpha=False)
+    pixels = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+    # Stage 2: crop + encode every crop of this page (on the encoder threads, if any)
+    encoded = []
+    for rect, output_path in crops:
+        x0, y0, x1, y1 = rect
+        crop = pixels[
+            max(0, math.floor(y0 * ZOOM)):min(pix.height, math.ceil(y1 * ZOOM)),
+            max(0, math.floor(x0 * ZOOM)):min(pix.width, math.ceil(x1 * ZOOM)),
+        ]                                                       # slicing is a view, not a copy
+        if encode_pool is None:
+            writer.submit(output_path, _encode(crop, output_format))
+        else:
+            encoded.append((output_path, encode_pool.submit(_encode, crop, output_format)))
+
+    # Stage 3: hand each encoded image to the writer threads as soon as it is ready
+    for output_path, future in encoded:
+        writer.submit(output_path, future.result())
+    saved = writer.flush()
+
+    # Drop this page's pixmap now, not when the next page overwrites it. MuPDF's resource
+    # store is left alone: fonts/images shared between pages would be parsed again.
+    encoded = crop = pixels = pix = None
+    return saved
+
 
 class ImageSnipper:
-    def crop_and_save(self, page, rect, output_path):
+    """
+    Saves crops of PDF pages as image files, rendering each page only once.
+
+    Contract: crop_and_save(page, rect, path) only queues the crop; nothing is
+    written yet. page_done(page) renders the page and saves every crop queued
+    for it (in the background). close() saves any page still queued without a
+    page_done, then waits until every file is written. Call close() once, also
+    when processing fails.
 
+    in_process=True renders in the calling process (inline encoding, one writer
+    thread) instead of on a render process pool; for callers that already run
+    one process per PDF, such as batch_main.
+    """
+
+    def __init__(self, max_workers=None, output_format="png", in_process=False):
+        if output_format not in SAVE_OPTIONS:
+            raise ValueError(f"Unknown output format: {output_format!r} (expected one of {sorted(SAVE_OPTIONS)})")
+        self.max_workers   = max_workers or min(os.cpu_count() or 1, 4)
+        self.output_format = output_format     # also the file extension TaskPipeline uses
+        self.in_process    = in_process
+        self._writer       = None                # in_process only
+        self._pool       = None
+        self._pending    = []
+        self._page_cache = {}    # (pdf path, page.number) -> (page, [(rect, output_path), ...]) waiting for page_done
+
+    def crop_and_save(self, page, rect, output_path):
+        """Queue one crop of page; it is written by page_done(page) or, at the latest, close()."""
         if rect is None:
             print(f"Empty crop area for {output_path}. Skipping save.")
             return
 
-        pix = page.get_pixmap(clip=rect, matrix=pymupdf.Matrix(2, 2))   # Render the cropped area, matrix is used to increase the resolution of the output image
+        key = (page.parent.name, page.number)
+        if key not in self._page_cache:
+            self._page_cache[key] = (page, [])
+        self._page_cache[key][1].append((tuple(rect), output_path))
+
+    def page_done(self, page):
+        """Render the page once and save all crops queued for it."""
+        entry = self._page_cache.pop((page.parent.name, page.number), None)
+        if entry is not None:
+            self._submit(*entry)
+
+    def _submit(self, page, crops):
+        if self.in_process:
+            if self._writer is None:
+                self._writer = _WriterPool(max_workers=1)
+            for output_path in _render_crops(page, crops, self.output_format, None, self._writer):
+                print(f"Crop saved: {output_path}")
+            return
+
+        # Rendering runs in worker processes; each one opens the PDF itself (pages can't be pickled)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._pending.append(
+            self._pool.submit(_render_page_crops, page.parent.name, page.number, crops, self.output_format)
+        )
+
+    def flush(self):
+        """Wait for all submitted crops to be written."""
+        for future in self._pending:
+            for output_path in future.result():
+                print(f"Crop saved: {output_path}")
+        self._pending.clear()
 
-        pix.save(output_path)        # Save the result
-        print(f"Crop saved: {output_path}")
+    def close(self):
+        """Save pages still queued (no page_done yet), wait for all writes, stop the workers."""
+        leftover, self._page_cache = self._page_cache, {}
+        try:
+            for page, crops in leftover.values():
+                self._submit(page, crops)
+            self.flush()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
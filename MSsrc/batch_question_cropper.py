@@ -5,11 +5,74 @@ Verarbeitet alle Marking Scheme PDFs und erstellt Question-Crops.
 """
 
 from question_cropper import ImprovedQuestionCropper
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import List
+import os
 import time
 
 
+def _crop_one(
+    pdf_file: str,
+    output_base_dir: str,
+    resolution: int,
+    margin: int,
+    start_page: int
+) -> dict:
+    """
+    Croppt ein PDF (läuft in einem eigenen Prozess).
+    
+    Returns:
+        Statistik-Dict für dieses PDF
+    """
+    pdf_path = Path(pdf_file)
+    
+    print(f"\n{'='*70}")
+    print(f"PDF: {pdf_path.name}")
+    print(f"{'='*70}")
+    
+    # Erstelle Unterverzeichnis für dieses PDF
+    output_dir = Path(output_base_dir) / pdf_path.stem
+    
+    try:
+        start_time = time.time()
+        
+        # Erstelle Cropper und extrahiere Fragen
+        # PDFs laufen schon parallel -> Seiten innerhalb des PDFs seriell
+        with ImprovedQuestionCropper(
+            str(pdf_path),
+            resolution=resolution,
+            max_workers=1
+        ) as cropper:
+            crops = cropper.extract_all_questions(
+                output_dir=str(output_dir),
+                start_page=start_page,
+                include_header=True,
+                margin=margin
+            )
+        
+        elapsed = time.time() - start_time
+        
+        print(f"\n✅ {pdf_path.name} fertig in {elapsed:.1f}s")
+        print(f"📁 Gespeichert in: {output_dir}")
+        
+        # Statistiken
+        return {
+            'crops': len(crops),
+            'output_dir': str(output_dir),
+            'time': elapsed
+        }
+        
+    except Exception as e:
+        print(f"\n❌ FEHLER bei {pdf_path.name}: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'crops': 0,
+            'error': str(e)
+        }
+
+
 def crop_all_pdfs(
     pdf_files: List[str],
     output_base_dir: str = "/home/claude/all_question_crops",
@@ -27,8 +90,6 @@ def crop_all_pdfs(
         margin: Rand um Crops in Pixeln
         start_page: Erste Seite zum Scannen
     """
-    base_path = Path(output_base_dir)
-    
     all_results = {}
     total_crops = 0
     
@@ -41,59 +102,34 @@ def crop_all_pdfs(
     print(f"Margin: {margin}px")
     print("="*70)
     
+    # Jedes PDF ist unabhängig (eigener Cropper, eigener Ordner) -> ein Prozess pro PDF.
+    # Prozesse statt Threads, da PyMuPDF nicht thread-safe ist.
+    existing = []
     for pdf_file in pdf_files:
         pdf_path = Path(pdf_file)
-        
         if not pdf_path.exists():
             print(f"\n⚠️  SKIP: {pdf_path.name} nicht gefunden")
             continue
-        
-        print(f"\n{'='*70}")
-        print(f"PDF: {pdf_path.name}")
-        print(f"{'='*70}")
-        
-        # Erstelle Unterverzeichnis für dieses PDF
-        output_dir = base_path / pdf_path.stem
-        
-        try:
-            start_time = time.time()
-            
-            # Erstelle Cropper
-            cropper = ImprovedQuestionCropper(
-                str(pdf_path),
-                resolution=resolution
-            )
-            
-            # Extrahiere Fragen
-            crops = cropper.extract_all_questions(
-                output_dir=str(output_dir),
-                start_page=start_page,
-                include_header=True,
-                margin=margin
-            )
-            
-            elapsed = time.time() - start_time
-            
-            # Statistiken
-            all_results[pdf_path.name] = {
-                'crops': len(crops),
-                'output_dir': str(output_dir),
-                'time': elapsed
-            }
-            
-            total_crops += len(crops)
-            
-            print(f"\n✅ Fertig in {elapsed:.1f}s")
-            print(f"📁 Gespeichert in: {output_dir}")
-            
-        except Exception as e:
-            print(f"\n❌ FEHLER bei {pdf_path.name}: {e}")
-            import traceback
-            traceback.print_exc()
-            all_results[pdf_path.name] = {
-                'crops': 0,
-                'error': str(e)
+        existing.append(pdf_path)
+    
+    if existing:
+        max_workers = min(len(existing), os.cpu_count() or 4)
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            futures = {
+                ex.submit(_crop_one, str(p), output_base_dir, resolution, margin, start_page): p
+                for p in existing
             }
+            for future in as_completed(futures):
+                pdf_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # z.B. abgestürzter Worker-Prozess (BrokenProcessPool): nur dieses PDF
+                    # als Fehler zählen, die übrigen PDFs und die Zusammenfassung laufen weiter
+                    print(f"\n❌ FEHLER bei {pdf_path.name}: {e}")
+                    result = {'crops': 0, 'error': f"{type(e).__name__}: {e}"}
+                all_results[pdf_path.name] = result
+                total_crops += result['crops']
     
     # Finale Zusammenfassung
     print("\n" + "="*70)
@@ -119,14 +155,17 @@ def crop_single_pdf(
     **kwargs
 ):
     """Croppt ein einzelnes PDF"""
-    cropper = ImprovedQuestionCropper(pdf_file, resolution=kwargs.get('resolution', 300))
-    
-    return cropper.extract_all_questions(
-        output_dir=output_dir,
-        start_page=kwargs.get('start_page', 5),
-        include_header=kwargs.get('include_header', True),
-        margin=kwargs.get('margin', 10)
-    )
+    with ImprovedQuestionCropper(
+        pdf_file,
+        resolution=kwargs.get('resolution', 300),
+        max_workers=kwargs.get('max_workers', 1)
+    ) as cropper:
+        return cropper.extract_all_questions(
+            output_dir=output_dir,
+            start_page=kwargs.get('start_page', 5),
+            include_header=kwargs.get('include_header', True),
+            margin=kwargs.get('margin', 10)
+        )
 
 
 def compare_crops(results: dict):
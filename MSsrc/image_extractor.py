@@ -5,13 +5,15 @@ Spezialisiertes Modul zum Extrahieren und Verarbeiten von Bildern
 aus Marking Scheme PDFs
 """
 
+from functools import cached_property
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import List, Tuple
+import os
 import subprocess
-from PIL import Image
+import numpy as np
 import pdfplumber
+import pymupdf
 from pdf2image import convert_from_path
-import io
 
 
 class ImageExtractor:
@@ -27,6 +29,29 @@ class ImageExtractor:
         if not self.pdf_path.exists():
             raise FileNotFoundError(f"PDF nicht gefunden: {pdf_path}")
     
+    @cached_property
+    def _pdf(self):
+        """Einmal geöffnetes pdfplumber-Dokument (lazy, für alle Methoden geteilt)"""
+        return pdfplumber.open(self.pdf_path)
+    
+    @cached_property
+    def _doc(self):
+        """Einmal geöffnetes PyMuPDF-Dokument (für direkte Bild-Extraktion)"""
+        return pymupdf.open(self.pdf_path)
+    
+    def close(self):
+        """Schließt das PDF, falls es geöffnet wurde"""
+        for name in ('_pdf', '_doc'):
+            doc = self.__dict__.pop(name, None)
+            if doc is not None:
+                doc.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     def extract_all_images(self, output_dir: str, method: str = "auto") -> List[Path]:
         """
         Extrahiert alle Bilder aus dem PDF
@@ -67,30 +92,16 @@ class ImageExtractor:
         
         output_prefix = output_dir / f"{self.pdf_path.stem}"
         
-        # pdfimages ausführen (-j für JPEG, -png für PNG)
+        # pdfimages ausführen (-png: schreibt direkt PNG, keine Konvertierung nötig)
         subprocess.run([
             "pdfimages",
-            "-all",  # Alle Bildformate
+            "-png",
             str(self.pdf_path),
             str(output_prefix)
         ], check=True, capture_output=True)
         
         # Finde alle extrahierten Bilder
-        image_files = []
-        for ext in ['.png', '.jpg', '.jpeg', '.ppm', '.pbm']:
-            image_files.extend(output_dir.glob(f"{self.pdf_path.stem}*{ext}"))
-        
-        # Konvertiere alle zu PNG für Konsistenz
-        png_files = []
-        for img_file in image_files:
-            if img_file.suffix.lower() != '.png':
-                png_file = img_file.with_suffix('.png')
-                img = Image.open(img_file)
-                img.save(png_file)
-                img_file.unlink()  # Lösche Original
-                png_files.append(png_file)
-            else:
-                png_files.append(img_file)
+        png_files = sorted(output_dir.glob(f"{self.pdf_path.stem}*.png"))
         
         print(f"✓ {len(png_files)} Bilder extrahiert")
         return png_files
@@ -101,32 +112,34 @@ class ImageExtractor:
         
         image_files = []
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Extrahiere Bilder von dieser Seite
-                images = page.images
-                
-                for img_idx, img_obj in enumerate(images):
-                    try:
-                        # Crop das Bild aus der Seite
-                        bbox = (
-                            img_obj['x0'],
-                            img_obj['top'],
-                            img_obj['x1'],
-                            img_obj['bottom']
-                        )
-                        
-                        # Rendere die Seite als Bild und croppe
-                        page_image = page.to_image(resolution=300)
-                        cropped = page_image.original.crop(bbox)
-                        
-                        # Speichere
-                        filename = output_dir / f"page{page_num:03d}_img{img_idx:03d}.png"
-                        cropped.save(filename, "PNG")
-                        image_files.append(filename)
+        for page_num, page in enumerate(self._pdf.pages, 1):
+            # Extrahiere Bilder von dieser Seite
+            images = page.images
+            if not images:
+                continue
+            
+            # Rendere die Seite einmal als Bild (nicht pro Bild erneut)
+            page_image = page.to_image(resolution=300)
+            
+            for img_idx, img_obj in enumerate(images):
+                try:
+                    # Crop das Bild aus der Seite
+                    bbox = (
+                        img_obj['x0'],
+                        img_obj['top'],
+                        img_obj['x1'],
+                        img_obj['bottom']
+                    )
+                    
+                    cropped = page_image.original.crop(bbox)
                     
-                    except Exception as e:
-                        print(f"Warnung: Konnte Bild {img_idx} auf Seite {page_num} nicht extrahieren: {e}")
+                    # Speichere
+                    filename = output_dir / f"page{page_num:03d}_img{img_idx:03d}.png"
+                    cropped.save(filename, "PNG", compress_level=1, optimize=False)
+                    image_files.append(filename)
+                
+                except Exception as e:
+                    print(f"Warnung: Konnte Bild {img_idx} auf Seite {page_num} nicht extrahieren: {e}")
         
         print(f"✓ {len(image_files)} Bilder extrahiert")
         return image_files
@@ -135,18 +148,23 @@ class ImageExtractor:
         """Konvertiert jede Seite zu einem Bild"""
         print("Konvertiere PDF-Seiten zu Bildern...")
         
-        # Konvertiere PDF zu Bildern
-        images = convert_from_path(
+        # Konvertiere PDF zu Bildern - pdftoppm schreibt die Seiten direkt
+        # in output_dir (kein Dekodieren + Neu-Kodieren in Python).
+        # Hinweis macOS: viele Threads öffnen viele Dateien, ggf. `ulimit -n` erhöhen.
+        page_paths = convert_from_path(
             str(self.pdf_path),
             dpi=300,
-            fmt='png'
+            fmt='png',
+            thread_count=max(1, (os.cpu_count() or 2) - 1),
+            output_folder=str(output_dir),
+            paths_only=True
         )
         
-        # Speichere jede Seite
+        # Benenne jede Seite um
         image_files = []
-        for i, image in enumerate(images, 1):
+        for i, page_path in enumerate(page_paths, 1):
             filename = output_dir / f"page{i:03d}.png"
-            image.save(filename, "PNG")
+            os.replace(page_path, filename)
             image_files.append(filename)
         
         print(f"✓ {len(image_files)} Seiten konvertiert")
@@ -159,48 +177,52 @@ class ImageExtractor:
         crop_margin: int = 10
     ) -> List[Path]:
         """
-        Extrahiert alle Bilder von einer spezifischen Seite
+        Extrahiert alle Bilder von einer spezifischen Seite.
+        
+        Eingebettete Bilder werden direkt aus dem PDF-Stream gelesen (ohne
+        die Seite zu rendern). Nur maskierte Bilder (SMask) werden gerendert
+        und gecroppt.
         
         Args:
             page_num: Seitennummer (1-basiert)
             output_dir: Ausgabe-Verzeichnis
-            crop_margin: Zusätzlicher Rand um das Bild in Pixeln
+            crop_margin: Zusätzlicher Rand um gerenderte Bilder in Punkten
         """
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
         image_files = []
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            if page_num < 1 or page_num > len(pdf.pages):
-                raise ValueError(f"Ungültige Seitennummer: {page_num}")
-            
-            page = pdf.pages[page_num - 1]
-            images = page.images
-            
-            for img_idx, img_obj in enumerate(images):
-                try:
-                    # Berechne Bounding Box mit Margin
-                    x0 = max(0, img_obj['x0'] - crop_margin)
-                    y0 = max(0, img_obj['top'] - crop_margin)
-                    x1 = min(page.width, img_obj['x1'] + crop_margin)
-                    y1 = min(page.height, img_obj['bottom'] + crop_margin)
-                    
-                    bbox = (x0, y0, x1, y1)
-                    
-                    # Rendere und croppe
-                    page_image = page.to_image(resolution=300)
-                    cropped = page_image.original.crop(bbox)
-                    
-                    # Speichere
-                    filename = output_path / f"page{page_num:03d}_img{img_idx:03d}.png"
-                    cropped.save(filename, "PNG")
-                    image_files.append(filename)
-                    
-                    print(f"✓ Extrahiert: {filename.name} ({cropped.width}x{cropped.height}px)")
+        doc = self._doc
+        if page_num < 1 or page_num > len(doc):
+            raise ValueError(f"Ungültige Seitennummer: {page_num}")
+        
+        page = doc[page_num - 1]
+        
+        for img_idx, img_info in enumerate(page.get_images(full=True)):
+            xref, smask = img_info[0], img_info[1]
+            filename = output_path / f"page{page_num:03d}_img{img_idx:03d}.png"
+            try:
+                if smask == 0:
+                    # Original-Bilddaten direkt aus dem XObject
+                    pix = pymupdf.Pixmap(doc, xref)
+                    if pix.n - pix.alpha >= 4:  # CMYK -> RGB für PNG
+                        pix = pymupdf.Pixmap(pymupdf.csRGB, pix)
+                else:
+                    # Maskiertes Bild: Region rendern (mit Margin)
+                    rects = page.get_image_rects(xref)
+                    if not rects:
+                        continue
+                    clip = rects[0] + (-crop_margin, -crop_margin, crop_margin, crop_margin)
+                    pix = page.get_pixmap(clip=clip & page.rect, dpi=300)
                 
-                except Exception as e:
-                    print(f"✗ Fehler bei Bild {img_idx} auf Seite {page_num}: {e}")
+                pix.save(filename)
+                image_files.append(filename)
+                
+                print(f"✓ Extrahiert: {filename.name} ({pix.width}x{pix.height}px)")
+            
+            except Exception as e:
+                print(f"✗ Fehler bei Bild {img_idx} auf Seite {page_num}: {e}")
         
         return image_files
     
@@ -213,35 +235,33 @@ class ImageExtractor:
         """
         bboxes = []
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            if page_num < 1 or page_num > len(pdf.pages):
-                return bboxes
+        pdf = self._pdf
+        if page_num < 1 or page_num > len(pdf.pages):
+            return bboxes
+        
+        page = pdf.pages[page_num - 1]
+        
+        # Finde Rechtecke und Linien (typisch für Diagramme)
+        rects = page.rects
+        lines = page.lines
+        
+        # Gruppiere nahe beieinander liegende Linien
+        # (vereinfachte Heuristik)
+        if len(lines) > 4:
+            # Berechne Bounding Box um alle Linien (vektorisiert statt Python-Listen)
+            coords = np.fromiter(
+                (v for line in lines for v in (line['x0'], line['x1'], line['top'], line['bottom'])),
+                dtype=np.float64,
+                count=len(lines) * 4
+            ).reshape(-1, 4)
             
-            page = pdf.pages[page_num - 1]
-            
-            # Finde Rechtecke und Linien (typisch für Diagramme)
-            rects = page.rects
-            lines = page.lines
-            
-            # Gruppiere nahe beieinander liegende Linien
-            # (vereinfachte Heuristik)
-            if len(lines) > 4:
-                # Berechne Bounding Box um alle Linien
-                x_coords = []
-                y_coords = []
-                
-                for line in lines:
-                    x_coords.extend([line['x0'], line['x1']])
-                    y_coords.extend([line['top'], line['bottom']])
-                
-                if x_coords and y_coords:
-                    bbox = (
-                        min(x_coords),
-                        min(y_coords),
-                        max(x_coords),
-                        max(y_coords)
-                    )
-                    bboxes.append(bbox)
+            bbox = (
+                float(coords[:, :2].min()),
+                float(coords[:, 2:].min()),
+                float(coords[:, :2].max()),
+                float(coords[:, 2:].max())
+            )
+            bboxes.append(bbox)
         
         return bboxes
     
@@ -264,25 +284,24 @@ class ImageExtractor:
         output_path = Path(output_file)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            page = pdf.pages[page_num - 1]
-            
-            # Rendere Seite
-            page_image = page.to_image(resolution=resolution)
-            
-            # Skaliere bbox entsprechend der Auflösung
-            scale = resolution / 72  # 72 DPI ist Standard
-            scaled_bbox = tuple(coord * scale for coord in bbox)
-            
-            # Croppe
-            cropped = page_image.original.crop(scaled_bbox)
-            
-            # Speichere
-            cropped.save(output_path, "PNG")
-            
-            print(f"✓ Region gespeichert: {output_path.name} ({cropped.width}x{cropped.height}px)")
-            
-            return output_path
+        page = self._pdf.pages[page_num - 1]
+        
+        # Rendere Seite
+        page_image = page.to_image(resolution=resolution)
+        
+        # Skaliere bbox entsprechend der Auflösung
+        scale = resolution / 72  # 72 DPI ist Standard
+        scaled_bbox = tuple(coord * scale for coord in bbox)
+        
+        # Croppe
+        cropped = page_image.original.crop(scaled_bbox)
+        
+        # Speichere
+        cropped.save(output_path, "PNG", compress_level=1, optimize=False)
+        
+        print(f"✓ Region gespeichert: {output_path.name} ({cropped.width}x{cropped.height}px)")
+        
+        return output_path
     
     def get_image_metadata(self) -> dict:
         """Gibt Metadaten über Bilder im PDF zurück"""
@@ -293,15 +312,15 @@ class ImageExtractor:
             'images_per_page': {}
         }
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            metadata['total_pages'] = len(pdf.pages)
-            
-            for page_num, page in enumerate(pdf.pages, 1):
-                num_images = len(page.images)
-                if num_images > 0:
-                    metadata['pages_with_images'] += 1
-                    metadata['total_images'] += num_images
-                    metadata['images_per_page'][page_num] = num_images
+        pdf = self._pdf
+        metadata['total_pages'] = len(pdf.pages)
+        
+        for page_num, page in enumerate(pdf.pages, 1):
+            num_images = len(page.images)
+            if num_images > 0:
+                metadata['pages_with_images'] += 1
+                metadata['total_images'] += num_images
+                metadata['images_per_page'][page_num] = num_images
         
         return metadata
 
@@ -321,11 +340,12 @@ def batch_extract_images(pdf_files: List[str], output_base_dir: str):
         output_dir = base_path / pdf_path.stem
         
         # Extrahiere
-        extractor = ImageExtractor(pdf_file)
-        images = extractor.extract_all_images(str(output_dir))
+        with ImageExtractor(pdf_file) as extractor:
+            images = extractor.extract_all_images(str(output_dir))
+            
+            # Metadaten
+            metadata = extractor.get_image_metadata()
         
-        # Metadaten
-        metadata = extractor.get_image_metadata()
         print(f"\nMetadaten:")
         print(f"  Seiten gesamt: {metadata['total_pages']}")
         print(f"  Seiten mit Bildern: {metadata['pages_with_images']}")
@@ -357,3 +377,5 @@ if __name__ == "__main__":
             page_with_images,
             "/home/claude/page_images"
         )
+    
+    extractor.close()
@@ -8,18 +8,96 @@ Autor: Claude
 Datum: 2026-02-16
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 import pdfplumber
 from pypdf import PdfReader
 import subprocess
+import io
 import json
+import os
 import re
+import shutil
+import sys
 from PIL import Image as PILImage
 
+try:
+    import orjson  # schneller JSON-Export (optional)
+except ImportError:
+    orjson = None
 
-@dataclass
+
+# Vorkompilierte Patterns (werden pro Tabellenzeile / Seite genutzt)
+_MARK_RE = re.compile(r'([MAB])(\d+)(?:ft)?')      # M1, A1, B1, B1ft
+# Alle Metadaten der Titelseite in einem Durchlauf
+_META_RE = re.compile(
+    r'(?P<date>(?:Summer|Winter)\s+\d{4})'
+    r'|Paper\s+(?P<code>\w+_\d+)'
+    r'|(?P<further>Further Mathematics)'
+    r'|(?P<maths>Mathematics)'
+    r'|(?P<board>Pearson|Edexcel)'
+    r'|(?P<title>Mark Scheme)'
+)
+_QPART_RE = re.compile(r'\(([a-z]+)\)')             # (a), (ii)
+
+def _json_dumps(obj) -> bytes:
+    """Serialisiert obj als eingerücktes UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str)
+    return json.dumps(obj, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _json_indent(data: bytes, width: int) -> bytes:
+    """Rückt alle Folgezeilen ein (JSON-Strings enthalten keine rohen Zeilenumbrüche)"""
+    return data.replace(b'\n', b'\n' + b' ' * width)
+
+
+# Keine pdfminer-Layoutanalyse: Tabellen und Text brauchen nur die rohen chars/edges.
+# (laparams=None ist der pdfplumber-Default; jedes LAParams-Dict würde die
+# teure Analyse erst einschalten)
+_LAPARAMS = None
+
+# PDFs bis zu dieser Größe werden komplett in den Speicher gelesen
+_IN_MEMORY_MAX_BYTES = 50 * 1024 * 1024
+
+# Weniger Linien/Rechteck-Kanten kann keine Tabelle haben
+_MIN_TABLE_EDGES = 4
+
+# Erst ab so vielen Seiten lohnt der Prozess-Pool (Start + pdfplumber-Import pro Worker)
+_PARALLEL_MIN_PAGES = 40
+
+
+# Worker-Prozesse für die Seiten-Extraktion: jeder Prozess öffnet das PDF einmal
+_worker_pdf = None
+
+
+def _init_page_worker(pdf_path: str):
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(pdf_path, laparams=_LAPARAMS)
+
+
+def _extract_page(page_num: int) -> Tuple[List, Optional[str]]:
+    """Extrahiert Tabellen und Text einer Seite (1-basiert) im Worker-Prozess"""
+    return _page_tables_and_text(_worker_pdf.pages[page_num - 1])
+
+
+def _page_tables_and_text(page) -> Tuple[List, Optional[str]]:
+    """Tabellen und Text einer pdfplumber-Seite"""
+    # Das pdfminer-Layout entsteht nur einmal: pdfplumber cacht page.objects beim ersten
+    # Zugriff (hier page.edges), extract_tables() und extract_text() lesen danach aus dem Cache.
+    # extract_text() bleibt bewusst (statt Wörter zu joinen), weil _extract_notes
+    # die Zeilenumbrüche braucht.
+    #
+    # Eine Tabelle (Standard-Strategie "lines") braucht mindestens 2 horizontale
+    # und 2 vertikale Kanten - reine Textseiten überspringen die Cluster-Erkennung
+    if len(page.edges) < _MIN_TABLE_EDGES:
+        return [], page.extract_text()
+    return page.extract_tables(), page.extract_text()
+
+
+@dataclass(slots=True, frozen=True)
 class Mark:
     """Repräsentiert eine einzelne Mark (z.B. M1, A1, B1)"""
     mark_type: str  # M, A, B
@@ -28,9 +106,13 @@ class Mark:
     
     def __str__(self):
         return f"{self.mark_type}{self.points}"
+    
+    def to_dict(self) -> Dict:
+        """JSON-Darstellung"""
+        return {'type': self.mark_type, 'points': self.points, 'ao': self.ao}
 
 
-@dataclass
+@dataclass(slots=True)
 class QuestionPart:
     """Repräsentiert einen Teil einer Frage (z.B. 1(a), 2(b)(ii))"""
     part_id: str  # z.B. "1(a)", "2(b)(ii)"
@@ -47,9 +129,21 @@ class QuestionPart:
     def add_image(self, image: 'ExtractedImage'):
         """Fügt ein Bild hinzu"""
         self.images.append(image)
+    
+    def to_dict(self) -> Dict:
+        """JSON-Darstellung (nur gespeicherte Bilder)"""
+        return {
+            'part_id': self.part_id,
+            'scheme': self.scheme,
+            'marks': [m.to_dict() for m in self.marks],
+            'total_marks': self.total_marks,
+            'notes': self.notes,
+            'images': [{'id': img.image_id, 'path': str(img.image_path)}
+                       for img in self.images if img.image_path]
+        }
 
 
-@dataclass
+@dataclass(slots=True)
 class Question:
     """Repräsentiert eine vollständige Frage mit allen Teilen"""
     question_number: int
@@ -66,9 +160,17 @@ class Question:
         for part in self.parts:
             all_images.extend(part.images)
         return all_images
+    
+    def to_dict(self) -> Dict:
+        """JSON-Darstellung"""
+        return {
+            'question_number': self.question_number,
+            'total_marks': self.total_marks,
+            'parts': [part.to_dict() for part in self.parts]
+        }
 
 
-@dataclass
+@dataclass(slots=True)
 class ExtractedImage:
     """Repräsentiert ein extrahiertes Bild aus dem PDF"""
     image_id: str
@@ -76,7 +178,8 @@ class ExtractedImage:
     page_number: int
     bbox: Optional[Tuple[float, float, float, float]] = None  # (x0, y0, x1, y1)
     image_path: Optional[Path] = None
-    image_data: Optional[bytes] = None
+    image_data: Optional[bytes] = None  # oder ein anderes Buffer-Objekt (z.B. memoryview)
+    source_path: Optional[Path] = None  # Bilddatei auf der Platte (z.B. von pdfimages), wird nicht eingelesen
     
     def save(self, output_dir: Path):
         """Speichert das Bild in einem Verzeichnis"""
@@ -87,10 +190,41 @@ class ExtractedImage:
                 f.write(self.image_data)
             self.image_path = filepath
             return filepath
+        if self.source_path is not None:
+            # Datei liegt schon auf der Platte: Hardlink statt lesen + schreiben
+            output_dir.mkdir(parents=True, exist_ok=True)
+            filepath = output_dir / f"{self.image_id}.png"
+            filepath.unlink(missing_ok=True)
+            try:
+                os.link(self.source_path, filepath)
+            except OSError:
+                # anderes Dateisystem
+                shutil.copyfile(self.source_path, filepath)
+            self.image_path = filepath
+            return filepath
         return None
+    
+    def _save_raw(self, output_dir: Path, dir_fd: int) -> Optional[Path]:
+        """
+        Wie save(), aber ohne mkdir: schreibt relativ zum bereits geöffneten
+        Verzeichnis dir_fd (für viele Bilder in dasselbe Verzeichnis)
+        """
+        if not self.image_data:
+            return self.save(output_dir) if self.source_path is not None else None
+        
+        filename = f"{self.image_id}.png"
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644, dir_fd=dir_fd)
+        try:
+            data = memoryview(self.image_data)
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+        self.image_path = output_dir / filename
+        return self.image_path
 
 
-@dataclass
+@dataclass(slots=True)
 class MarkingScheme:
     """Container für ein vollständiges Marking Scheme PDF"""
     pdf_path: Path
@@ -101,54 +235,49 @@ class MarkingScheme:
     exam_date: str  # z.B. "Summer 2018"
     questions: List[Question] = field(default_factory=list)
     metadata: Dict = field(default_factory=dict)
+    _q_index: Dict[int, Question] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Index Fragennummer -> Frage (erste Frage gewinnt, wie bei der linearen Suche)
+        for q in self.questions:
+            self._q_index.setdefault(q.question_number, q)
     
     def add_question(self, question: Question):
         """Fügt eine Frage hinzu"""
         self.questions.append(question)
+        self._q_index.setdefault(question.question_number, question)
     
     def get_question(self, number: int) -> Optional[Question]:
         """Gibt eine spezifische Frage zurück"""
-        for q in self.questions:
-            if q.question_number == number:
-                return q
-        return None
+        return self._q_index.get(number)
     
     def to_json(self, filepath: Path):
-        """Exportiert das Marking Scheme als JSON"""
-        data = {
+        """Exportiert das Marking Scheme als JSON (Frage für Frage geschrieben)"""
+        header = {
             'title': self.title,
             'exam_board': self.exam_board,
             'subject': self.subject,
             'paper_code': self.paper_code,
             'exam_date': self.exam_date,
             'metadata': self.metadata,
-            'questions': []
         }
+        with open(filepath, 'wb') as f:
+            self._stream_json(f, header)
+    
+    def _stream_json(self, f, header: Dict):
+        """
+        Schreibt das JSON-Dokument direkt in f, ohne den kompletten Baum
+        aufzubauen - im Speicher liegt immer nur eine Frage
+        """
+        f.write(b'{\n')
+        for key, value in header.items():
+            f.write(b'  ' + _json_dumps(key) + b': ' + _json_indent(_json_dumps(value), 2) + b',\n')
         
-        for question in self.questions:
-            q_data = {
-                'question_number': question.question_number,
-                'total_marks': question.total_marks,
-                'parts': []
-            }
-            
-            for part in question.parts:
-                part_data = {
-                    'part_id': part.part_id,
-                    'scheme': part.scheme,
-                    'marks': [{'type': m.mark_type, 'points': m.points, 'ao': m.ao} 
-                              for m in part.marks],
-                    'total_marks': part.total_marks,
-                    'notes': part.notes,
-                    'images': [{'id': img.image_id, 'path': str(img.image_path)} 
-                               for img in part.images if img.image_path]
-                }
-                q_data['parts'].append(part_data)
-            
-            data['questions'].append(q_data)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write(b'  "questions": [')
+        for i, question in enumerate(self.questions):
+            f.write(b',\n    ' if i else b'\n    ')
+            f.write(_json_indent(_json_dumps(question.to_dict()), 4))
+        f.write(b'\n  ]\n}' if self.questions else b']\n}')
 
 
 class MarkingSchemeParser:
@@ -156,94 +285,140 @@ class MarkingSchemeParser:
     Hauptklasse zum Parsen von Marking Scheme PDFs
     """
     
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, max_workers: Optional[int] = None):
         self.pdf_path = Path(pdf_path)
         if not self.pdf_path.exists():
             raise FileNotFoundError(f"PDF nicht gefunden: {pdf_path}")
         
+        # Prozesse für die Seiten-Extraktion (None = automatisch, 1 = alles im aktuellen Prozess)
+        self.max_workers = max_workers
         self.marking_scheme = None
         self.current_question = None
+        self._pdfimages_proc = None
         
     def parse(self) -> MarkingScheme:
         """Parst das gesamte PDF und gibt ein MarkingScheme Objekt zurück"""
         print(f"Parse PDF: {self.pdf_path.name}")
         
-        # 1. Extrahiere Metadaten
-        metadata = self._extract_metadata()
+        # pdfimages läuft parallel zum Parsen der Tabellen (wird erst in Schritt 4 gebraucht)
+        self._start_pdfimages()
         
-        # 2. Erstelle MarkingScheme Objekt
-        self.marking_scheme = MarkingScheme(
-            pdf_path=self.pdf_path,
-            title=metadata.get('title', ''),
-            exam_board=metadata.get('exam_board', ''),
-            subject=metadata.get('subject', ''),
-            paper_code=metadata.get('paper_code', ''),
-            exam_date=metadata.get('exam_date', ''),
-            metadata=metadata
-        )
-        
-        # 3. Extrahiere Fragen und Tabellen
-        self._extract_questions()
-        
-        # 4. Extrahiere Bilder
-        self._extract_images()
+        try:
+            # PDF nur einmal öffnen und an alle Phasen weitergeben
+            with self._open_pdf() as pdf:
+                # 1. Extrahiere Metadaten
+                metadata = self._extract_metadata(pdf)
+            
+                # 2. Erstelle MarkingScheme Objekt
+                self.marking_scheme = MarkingScheme(
+                    pdf_path=self.pdf_path,
+                    title=metadata.get('title', ''),
+                    exam_board=metadata.get('exam_board', ''),
+                    subject=metadata.get('subject', ''),
+                    paper_code=metadata.get('paper_code', ''),
+                    exam_date=metadata.get('exam_date', ''),
+                    metadata=metadata
+                )
+            
+                # 3. Extrahiere Fragen und Tabellen
+                self._extract_questions(pdf)
+            
+                # 4. Extrahiere Bilder
+                self._extract_images(pdf)
+        finally:
+            # pdfimages nicht verwaist zurücklassen, wenn eine Phase vorher scheitert
+            self._stop_pdfimages()
         
         return self.marking_scheme
     
-    def _extract_metadata(self) -> Dict:
+    def _open_pdf(self):
+        """
+        Öffnet das PDF mit pdfplumber. Kleine PDFs werden vorher komplett
+        gelesen, damit die vielen kleinen Seeks des PDF-Lexers im Speicher
+        statt über Datei-I/O laufen.
+        """
+        if self.pdf_path.stat().st_size < _IN_MEMORY_MAX_BYTES:
+            return pdfplumber.open(io.BytesIO(self.pdf_path.read_bytes()), laparams=_LAPARAMS)
+        return pdfplumber.open(self.pdf_path, laparams=_LAPARAMS)
+    
+    def _extract_metadata(self, pdf) -> Dict:
         """Extrahiert Metadaten aus den ersten Seiten"""
         metadata = {}
         
-        with pdfplumber.open(self.pdf_path) as pdf:
-            # Erste Seite enthält typischerweise den Titel
-            if len(pdf.pages) > 0:
-                first_page_text = pdf.pages[0].extract_text()
-                
-                # Beispiel-Parsing (anpassbar an deine spezifischen PDFs)
-                if "Mark Scheme" in first_page_text:
+        # Erste Seite enthält typischerweise den Titel
+        if len(pdf.pages) > 0:
+            first_page_text = pdf.pages[0].extract_text()
+            
+            # Beispiel-Parsing (anpassbar an deine spezifischen PDFs)
+            subject = None
+            for match in _META_RE.finditer(first_page_text):
+                kind = match.lastgroup
+                if kind == 'title':
                     metadata['title'] = 'Mark Scheme (Results)'
-                
-                # Exam Board
-                if "Pearson" in first_page_text or "Edexcel" in first_page_text:
+                elif kind == 'board':
+                    # Exam Board
                     metadata['exam_board'] = 'Pearson Edexcel'
-                
-                # Datum
-                date_match = re.search(r'(Summer|Winter)\s+(\d{4})', first_page_text)
-                if date_match:
-                    metadata['exam_date'] = f"{date_match.group(1)} {date_match.group(2)}"
-                
-                # Paper Code
-                code_match = re.search(r'Paper\s+(\w+_\d+)', first_page_text)
-                if code_match:
-                    metadata['paper_code'] = code_match.group(1)
-                
-                # Subject
-                if "Further Mathematics" in first_page_text:
-                    metadata['subject'] = 'Further Mathematics'
-                elif "Mathematics" in first_page_text:
-                    metadata['subject'] = 'Mathematics'
+                elif kind == 'date':
+                    # Datum (erster Treffer, Whitespace normalisiert)
+                    if 'exam_date' not in metadata:
+                        season, year = match.group('date').split()
+                        metadata['exam_date'] = f"{season} {year}"
+                elif kind == 'code':
+                    # Paper Code (erster Treffer)
+                    metadata.setdefault('paper_code', match.group('code'))
+                elif kind == 'further':
+                    subject = 'Further Mathematics'
+                elif kind == 'maths' and subject is None:
+                    subject = 'Mathematics'
+            
+            # Subject ("Further Mathematics" hat Vorrang)
+            if subject:
+                metadata['subject'] = subject
         
         return metadata
     
-    def _extract_questions(self):
+    def _extract_questions(self, pdf):
         """Extrahiert alle Fragen aus den Tabellen"""
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Überspringe Metadaten-Seiten (typischerweise erste 4 Seiten)
-                if page_num <= 4:
-                    continue
-                
-                # Extrahiere Tabellen von dieser Seite
-                tables = page.extract_tables()
-                
-                for table in tables:
-                    if table:
-                        self._process_table(table, page_num)
-                
-                # Extrahiere auch "Notes" Abschnitte
-                text = page.extract_text()
-                if text and "Notes" in text:
-                    self._extract_notes(text, page_num)
+        # Überspringe Metadaten-Seiten (typischerweise erste 4 Seiten)
+        page_nums = range(5, len(pdf.pages) + 1)
+        if not page_nums:
+            return
+        
+        # Kleine PDFs seriell auf dem schon geöffneten pdf: der Prozessstart
+        # kostet dort mehr, als pdfminer parallel einspart
+        max_workers = min(self.max_workers or os.cpu_count() or 1, len(page_nums))
+        if max_workers <= 1 or (self.max_workers is None and len(page_nums) < _PARALLEL_MIN_PAGES):
+            self._process_pages(page_nums, self._extract_pages_serial(pdf, page_nums))
+            return
+        
+        # Tabellen + Text parallel pro Seite extrahieren (rechenintensiv in pdfminer),
+        # Ergebnisse aber in Seitenreihenfolge verarbeiten
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_page_worker,
+            initargs=(str(self.pdf_path),)
+        ) as ex:
+            self._process_pages(page_nums, ex.map(_extract_page, page_nums))
+    
+    def _extract_pages_serial(self, pdf, page_nums: range):
+        """Liefert Tabellen und Text jeder Seite im aktuellen Prozess"""
+        for page_num in page_nums:
+            page = pdf.pages[page_num - 1]
+            result = _page_tables_and_text(page)
+            # pdfplumber-Objekte dieser Seite werden nicht mehr gebraucht
+            page.flush_cache()
+            yield result
+    
+    def _process_pages(self, page_nums: range, results):
+        """Verarbeitet die (Tabellen, Text)-Ergebnisse in Seitenreihenfolge"""
+        for page_num, (tables, text) in zip(page_nums, results):
+            for table in tables:
+                if table:
+                    self._process_table(table, page_num)
+            
+            # Extrahiere auch "Notes" Abschnitte
+            if text and "Notes" in text:
+                self._extract_notes(text, page_num)
     
     def _process_table(self, table: List[List[str]], page_num: int):
         """Verarbeitet eine einzelne Tabelle"""
@@ -306,29 +481,39 @@ class MarkingSchemeParser:
             return False
         
         # Typische Header: ["Question", "Scheme", "Marks", "AOs"]
-        header_str = " ".join([cell.lower() if cell else "" for cell in header])
-        return "question" in header_str or "scheme" in header_str
+        for cell in header:
+            if cell:
+                cell = cell.lower()
+                if "question" in cell or "scheme" in cell:
+                    return True
+        return False
     
     def _extract_question_number(self, question_id: str) -> int:
         """Extrahiert die Fragennummer aus einer ID wie '1(a)' oder '2(b)(ii)'"""
-        match = re.match(r'(\d+)', question_id)
-        if match:
-            return int(match.group(1))
-        return 0
+        # Führende Ziffern abtrennen (ohne Regex)
+        i = 0
+        n = len(question_id)
+        while i < n and '0' <= question_id[i] <= '9':
+            i += 1
+        return int(question_id[:i]) if i else 0
     
     def _parse_marks(self, marks_text: str, ao_text: str) -> List[Mark]:
         """Parst Mark-Strings wie 'M1', 'A1', 'B1ft'"""
         marks = []
         
         # Pattern für Marks: M1, A1, B1, B1ft, etc.
-        pattern = r'([MAB])(\d+)(?:ft)?'
-        matches = re.findall(pattern, marks_text)
+        matches = _MARK_RE.findall(marks_text)
+        if not matches:
+            return marks
+        
+        # AO-Strings wiederholen sich über alle Zeilen -> nur ein Objekt pro Wert
+        ao = sys.intern(ao_text)
         
         for mark_type, points in matches:
             mark = Mark(
-                mark_type=mark_type,
+                mark_type=sys.intern(mark_type),
                 points=int(points),
-                ao=ao_text
+                ao=ao
             )
             marks.append(mark)
         
@@ -336,101 +521,125 @@ class MarkingSchemeParser:
     
     def _extract_total_marks(self, marks_text: str) -> Optional[int]:
         """Extrahiert total marks aus einem String wie '(3)' oder '(5 marks)'"""
-        match = re.search(r'\((\d+)\)', marks_text)
-        if match:
-            return int(match.group(1))
+        # Erstes "(<Ziffern>)" suchen (ohne Regex)
+        i = marks_text.find('(')
+        while i != -1:
+            j = marks_text.find(')', i + 1)
+            if j == -1:
+                break
+            inner = marks_text[i + 1:j]
+            if inner.isdecimal():
+                return int(inner)
+            i = marks_text.find('(', i + 1)
         return None
     
     def _extract_notes(self, text: str, page_num: int):
         """Extrahiert Notes-Abschnitte und ordnet sie den Fragen zu"""
-        # Finde den Notes-Abschnitt
-        notes_match = re.search(r'Notes\s+(.*?)(?=\n\n|\Z)', text, re.DOTALL)
-        if notes_match:
-            notes_text = notes_match.group(1).strip()
+        # Finde den Notes-Abschnitt ("Notes" + Whitespace, bis zur nächsten Leerzeile)
+        i = text.find("Notes")
+        while i != -1 and not text[i + 5:i + 6].isspace():
+            i = text.find("Notes", i + 1)
+        if i != -1:
+            notes_text = text[i + 5:].lstrip().split("\n\n", 1)[0].strip()
             
             # Versuche, die Frage zu identifizieren
             # (z.B. "(a)" oder "Question 1")
-            question_match = re.search(r'\(([a-z]+)\)', notes_text)
+            question_match = _QPART_RE.search(notes_text)
             if question_match and self.marking_scheme.questions:
                 # Füge Notes zum letzten QuestionPart hinzu
                 last_question = self.marking_scheme.questions[-1]
                 if last_question.parts:
                     last_question.parts[-1].notes = notes_text
     
-    def _extract_images(self):
+    def _extract_images(self, pdf):
         """Extrahiert alle Bilder aus dem PDF"""
         print("Extrahiere Bilder...")
         
         # Methode 1: pdfplumber für Inline-Bilder
-        with pdfplumber.open(self.pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Überspringe Metadaten-Seiten
-                if page_num <= 4:
-                    continue
-                
-                # Extrahiere Bilder mit pdfplumber
-                for img_obj in page.images:
-                    try:
-                        # Erstelle ExtractedImage
-                        img = ExtractedImage(
-                            image_id=f"page{page_num}_img{len(page.images)}",
-                            question_part="",  # Wird später zugeordnet
-                            page_number=page_num,
-                            bbox=(img_obj['x0'], img_obj['top'], 
-                                  img_obj['x1'], img_obj['bottom'])
-                        )
-                        
-                        # Versuche, die Frage zuzuordnen
-                        question = self._find_question_for_page(page_num)
-                        if question and question.parts:
-                            question.parts[-1].add_image(img)
+        # Überspringe Metadaten-Seiten
+        for page_num, page in enumerate(pdf.pages[4:], 5):
+            # Extrahiere Bilder mit pdfplumber (eindeutige ID pro Bild der Seite)
+            for idx, img_obj in enumerate(page.images):
+                try:
+                    # Erstelle ExtractedImage
+                    img = ExtractedImage(
+                        image_id=f"page{page_num}_img{idx}",
+                        question_part="",  # Wird später zugeordnet
+                        page_number=page_num,
+                        bbox=(img_obj['x0'], img_obj['top'], 
+                              img_obj['x1'], img_obj['bottom'])
+                    )
                     
-                    except Exception as e:
-                        print(f"Warnung: Bild auf Seite {page_num} konnte nicht extrahiert werden: {e}")
+                    # Versuche, die Frage zuzuordnen
+                    question = self._find_question_for_page(page_num)
+                    if question and question.parts:
+                        question.parts[-1].add_image(img)
+                
+                except Exception as e:
+                    print(f"Warnung: Bild auf Seite {page_num} konnte nicht extrahiert werden: {e}")
         
         # Methode 2: pdfimages für alle Bilder
         self._extract_images_with_pdfimages()
     
-    def _extract_images_with_pdfimages(self):
-        """Nutzt pdfimages CLI tool für vollständige Bildextraktion"""
+    def _pdfimages_dir(self) -> Path:
+        """Temporäres Verzeichnis für die Ausgabe von pdfimages"""
+        return Path("/home/claude/temp_images")
+    
+    def _start_pdfimages(self):
+        """Startet pdfimages im Hintergrund"""
+        self._pdfimages_proc = None
+        # Temporäres Verzeichnis für Bilder
+        temp_dir = self._pdfimages_dir()
+        temp_dir.mkdir(exist_ok=True)
+        
+        # pdfimages ausführen
+        output_prefix = temp_dir / f"{self.pdf_path.stem}_img"
         try:
-            # Temporäres Verzeichnis für Bilder
-            temp_dir = Path("/home/claude/temp_images")
-            temp_dir.mkdir(exist_ok=True)
-            
-            # pdfimages ausführen
-            output_prefix = temp_dir / f"{self.pdf_path.stem}_img"
-            subprocess.run([
+            self._pdfimages_proc = subprocess.Popen([
                 "pdfimages",
                 "-j",  # JPEG Ausgabe
                 "-png",  # PNG Ausgabe
                 str(self.pdf_path),
                 str(output_prefix)
-            ], check=True, capture_output=True)
-            
-            print(f"Bilder extrahiert nach: {temp_dir}")
-            
-            # Ordne extrahierte Bilder den Fragen zu
-            for img_file in temp_dir.glob("*.png"):
-                # Lade Bilddaten
-                with open(img_file, 'rb') as f:
-                    img_data = f.read()
-                
-                # Erstelle ExtractedImage
-                img = ExtractedImage(
-                    image_id=img_file.stem,
-                    question_part="",
-                    page_number=0,  # Wird bestimmt durch Dateinamen
-                    image_data=img_data
-                )
-                
-                # TODO: Intelligentere Zuordnung zu Fragen
-                
-        except subprocess.CalledProcessError as e:
-            print(f"Warnung: pdfimages fehlgeschlagen: {e}")
+            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         except FileNotFoundError:
             print("Warnung: pdfimages nicht installiert. Installiere mit: apt-get install poppler-utils")
     
+    def _stop_pdfimages(self):
+        """Beendet einen noch laufenden pdfimages-Prozess und räumt seine Pipes ab"""
+        proc, self._pdfimages_proc = self._pdfimages_proc, None
+        if proc is not None:
+            proc.kill()
+            proc.communicate()
+    
+    def _extract_images_with_pdfimages(self):
+        """Nutzt pdfimages CLI tool für vollständige Bildextraktion"""
+        proc, self._pdfimages_proc = self._pdfimages_proc, None
+        if proc is None:
+            return
+        
+        # Auf den Hintergrundprozess warten (communicate verhindert volle Pipes)
+        stdout, stderr = proc.communicate()
+        if proc.returncode != 0:
+            e = subprocess.CalledProcessError(proc.returncode, proc.args, stdout, stderr)
+            print(f"Warnung: pdfimages fehlgeschlagen: {e}")
+            return
+        
+        temp_dir = self._pdfimages_dir()
+        print(f"Bilder extrahiert nach: {temp_dir}")
+        
+        # Ordne extrahierte Bilder den Fragen zu
+        for img_file in temp_dir.glob("*.png"):
+            # Erstelle ExtractedImage (Bilddaten bleiben auf der Platte)
+            img = ExtractedImage(
+                image_id=img_file.stem,
+                question_part="",
+                page_number=0,  # Wird bestimmt durch Dateinamen
+                source_path=img_file
+            )
+            
+            # TODO: Intelligentere Zuordnung zu Fragen
+    
     def _find_question_for_page(self, page_num: int) -> Optional[Question]:
         """Findet die Frage, die auf einer bestimmten Seite ist"""
         # Einfache Heuristik: Nimm die letzte Frage
@@ -455,11 +664,24 @@ class MarkingSchemeParser:
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
+        # Verzeichnis einmal öffnen, Bilder relativ dazu schreiben (falls vom OS unterstützt)
+        dir_fd = None
+        if os.open in os.supports_dir_fd:
+            dir_fd = os.open(output_path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        
         image_count = 0
-        for question in self.marking_scheme.questions:
-            for image in question.get_all_images():
-                if image.save(output_path):
-                    image_count += 1
+        try:
+            for question in self.marking_scheme.questions:
+                for image in question.get_all_images():
+                    if dir_fd is not None:
+                        saved = image._save_raw(output_path, dir_fd)
+                    else:
+                        saved = image.save(output_path)
+                    if saved:
+                        image_count += 1
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
         
         print(f"{image_count} Bilder exportiert nach: {output_path}")
 
@@ -1,8 +1,14 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import cached_property
+from itertools import repeat, zip_longest
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Iterator, Tuple, Optional
 import pdfplumber
+import numpy as np
+import pymupdf
 from PIL import Image
-import re
+import os
 
 
 class QuestionTableCrop:
@@ -35,13 +41,124 @@ class QuestionCropper:
     - Hohe Auflösung für gute Lesbarkeit
     """
     
-    def __init__(self, pdf_path: str, resolution: int = 300):
+    # Anzahl gerenderter Seiten, die für weitere Crops im Speicher bleiben
+    page_cache_size = 4
+    
+    # Ausgabeformate: PIL-Format + Speicheroptionen
+    # PNG mit compress_level=1: kaum größer als optimize=True, aber viel schneller
+    # (quality wird von PNG ignoriert). WebP: deutlich kleinere Dateien.
+    SAVE_OPTIONS = {
+        "png": ("PNG", {"compress_level": 1}),
+        "webp": ("WEBP", {"quality": 90, "method": 0}),
+    }
+    
+    def __init__(
+        self,
+        pdf_path: str,
+        resolution: int = 300,
+        max_workers: Optional[int] = None,
+        output_format: str = "png"
+    ):
         self.pdf_path = Path(pdf_path)
         if not self.pdf_path.exists():
             raise FileNotFoundError(f"PDF nicht gefunden: {pdf_path}")
+        if output_format not in self.SAVE_OPTIONS:
+            raise ValueError(f"Unbekanntes Ausgabeformat: {output_format}")
         
         self.resolution = resolution
+        self.output_format = output_format
+        # PDF-Punkte -> Pixel (72 DPI ist Standard), einmal pro Cropper berechnet
+        self._scale = resolution / 72
+        self._matrix = pymupdf.Matrix(self._scale, self._scale)
+        # Prozesse für die Tabellen-Erkennung (1 = alles im aktuellen Prozess)
+        self.max_workers = max_workers or min(os.cpu_count() or 1, 8)
         self.crops: List[QuestionTableCrop] = []
+        self._page_image_cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._pending_saves: Dict[Path, object] = {}  # Dateiname -> Future
+    
+    @cached_property
+    def _fitz_doc(self):
+        """Einmal geöffnetes PyMuPDF-Dokument zum Rendern (lazy)"""
+        return pymupdf.open(self.pdf_path)
+    
+    def close(self):
+        """Schließt das PyMuPDF-Dokument, falls es geöffnet wurde"""
+        self._page_image_cache.clear()
+        if self._io_pool is not None:
+            self._io_pool.shutdown()
+            self._io_pool = None
+        doc = self.__dict__.pop('_fitz_doc', None)
+        if doc is not None:
+            doc.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _submit_save(self, image: Image.Image, filename: Path):
+        """
+        Speichert ein Bild im Hintergrund-Thread (PIL gibt beim PNG-Encoding
+        die GIL frei), während die nächste Seite analysiert wird
+        """
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=4)
+        
+        # Dieselbe Datei nie gleichzeitig schreiben (Frage wird neu gespeichert)
+        previous = self._pending_saves.get(filename)
+        if previous is not None:
+            wait([previous])
+        pil_format, options = self.SAVE_OPTIONS[self.output_format]
+        self._pending_saves[filename] = self._io_pool.submit(image.save, filename, pil_format, **options)
+    
+    def _wait_saves(self, saved_files: List[Path]) -> List[Path]:
+        """Wartet auf alle Hintergrund-Speicherungen, gibt die erfolgreichen Dateien zurück"""
+        failed = set()
+        for filename, future in self._pending_saves.items():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"✗ Fehler beim Speichern von {filename.name}: {e}")
+                failed.add(filename)
+        self._pending_saves.clear()
+        return [f for f in saved_files if f not in failed]
+    
+    def _render_page(self, page_num: int, clip: Optional[Tuple] = None) -> Image.Image:
+        """
+        Rendert eine Seite (0-basiert) mit PyMuPDF in self.resolution DPI.
+        Mit clip (x0, y0, x1, y1 in PDF-Punkten) wird nur dieser Bereich gerastert.
+        """
+        pix = self._fitz_doc[page_num].get_pixmap(
+            matrix=self._matrix,
+            clip=pymupdf.Rect(clip) if clip else None,
+            alpha=False
+        )
+        return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    
+    def _render_page_array(self, page_num: int) -> np.ndarray:
+        """Rendert eine ganze Seite als (H, W, 3) uint8-Array"""
+        pix = self._fitz_doc[page_num].get_pixmap(matrix=self._matrix, alpha=False)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    
+    def _get_page_image(self, page, page_num: int) -> np.ndarray:
+        """
+        Rendert eine Seite einmal und hält die letzten Seiten im LRU-Cache.
+        Crops sind Slices (Views) dieses Arrays, keine Kopien.
+        """
+        cache = self._page_image_cache
+        image = cache.get(page_num)
+        if image is not None:
+            cache.move_to_end(page_num)
+            return image
+        
+        # MuPDF rastert nativ - deutlich schneller als pdfplumbers to_image()
+        image = self._render_page_array(page_num)
+        cache[page_num] = image
+        if len(cache) > self.page_cache_size:
+            cache.popitem(last=False)
+        return image
     
     def extract_all_questions(
         self,
@@ -68,6 +185,7 @@ class QuestionCropper:
         print(f"{'='*60}\n")
         
         saved_files = []
+        self._page_image_cache.clear()
         
         with pdfplumber.open(self.pdf_path) as pdf:
             # Bestimme Seitenbereich
@@ -78,23 +196,22 @@ class QuestionCropper:
             current_rows = []
             current_bbox = None
             current_page = None
+            current_table_obj = None
             
             for page_num in range(start_page - 1, min(end_page, len(pdf.pages))):
                 page = pdf.pages[page_num]
                 print(f"📄 Scanne Seite {page_num + 1}...")
                 
-                # Extrahiere Tabellen
-                tables = page.extract_tables()
+                # Tabellen einmal pro Seite finden; Daten und Table-Objekt (für die
+                # Bounding Box) gehören paarweise zusammen
+                # (extract_tables() würde find_tables() nur erneut ausführen)
+                table_objs = page.find_tables()
                 
-                for table in tables:
+                for table_obj in table_objs:
+                    table = table_obj.extract()
                     if not self._is_question_table(table):
                         continue
                     
-                    # Finde die Tabelle in den page.tables (für Bounding Box)
-                    table_obj = self._find_table_object(page, table)
-                    if not table_obj:
-                        continue
-                    
                     # Verarbeite jede Zeile der Tabelle
                     for row_idx, row in enumerate(table[1:], 1):  # Skip header
                         if not row or len(row) < 2:
@@ -112,7 +229,7 @@ class QuestionCropper:
                                     current_question,
                                     current_rows,
                                     current_page,
-                                    table_obj
+                                    current_table_obj
                                 )
                                 if crop:
                                     saved = self._save_crop(crop, output_path, page)
@@ -123,30 +240,32 @@ class QuestionCropper:
                             current_question = question_cell
                             current_rows = [row_idx]
                             current_page = page_num
+                            current_table_obj = table_obj
                         
                         elif current_question:
                             # Füge Zeile zur aktuellen Frage hinzu
                             current_rows.append(row_idx)
+                
+                # Tabellen dieser Seite sind ausgewertet: chars/edges freigeben
+                # (die Table-Objekte behalten ihre Zellen und damit die bbox)
+                page.flush_cache()
             
             # Speichere letzte Frage
             if current_question and current_rows:
-                # Hole letzte Seite und Tabelle
                 page = pdf.pages[current_page]
-                tables = page.extract_tables()
-                if tables:
-                    table_obj = self._find_table_object(page, tables[0])
-                    if table_obj:
-                        crop = self._create_crop(
-                            current_question,
-                            current_rows,
-                            current_page,
-                            table_obj
-                        )
-                        if crop:
-                            saved = self._save_crop(crop, output_path, page)
-                            if saved:
-                                saved_files.append(saved)
+                crop = self._create_crop(
+                    current_question,
+                    current_rows,
+                    current_page,
+                    current_table_obj
+                )
+                if crop:
+                    saved = self._save_crop(crop, output_path, page)
+                    if saved:
+                        saved_files.append(saved)
         
+        saved_files = self._wait_saves(saved_files)
+        self._page_image_cache.clear()
         print(f"\n✅ {len(saved_files)} Fragen erfolgreich gecroppt")
         return saved_files
     
@@ -159,16 +278,19 @@ class QuestionCropper:
         if not header or len(header) < 3:
             return False
         
-        # Prüfe auf typische Header
-        header_str = " ".join([str(cell).lower() for cell in header if cell])
-        return "question" in header_str and "scheme" in header_str
-    
-    def _find_table_object(self, page, table_data):
-        """Findet das Table-Objekt mit Bounding Box"""
-        # pdfplumber hat eine tables Property mit Bounding Boxes
-        for table_obj in page.find_tables():
-            return table_obj  # Nimm erste Tabelle
-        return None
+        # Prüfe auf typische Header (Abbruch, sobald beide Begriffe gefunden sind)
+        found_question = found_scheme = False
+        for cell in header:
+            if not cell:
+                continue
+            cell = str(cell).lower()
+            if not found_question and "question" in cell:
+                found_question = True
+            if not found_scheme and "scheme" in cell:
+                found_scheme = True
+            if found_question and found_scheme:
+                return True
+        return False
     
     def _extract_question_number(self, cell: str) -> Optional[str]:
         """
@@ -178,16 +300,26 @@ class QuestionCropper:
         if not cell:
             return None
         
-        # Pattern für Question IDs
-        patterns = [
-            r'^(\d+)\s*\([a-z]+\)',  # 1(a), 2(b)
-            r'^(\d+)$',  # Nur Nummer
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, cell.strip())
-            if match:
-                return cell.strip()
+        # Von Hand gescannt statt Regex: Ziffern, dann Ende oder "(<a-z>+)"
+        cell = cell.strip()
+        n = len(cell)
+        i = 0
+        while i < n and cell[i].isdecimal():
+            i += 1
+        if i == 0:
+            return None
+        if i == n:
+            return cell  # Nur Nummer
+        
+        # 1(a), 2 (b)
+        while i < n and cell[i].isspace():
+            i += 1
+        if i < n and cell[i] == '(':
+            j = i + 1
+            while j < n and 'a' <= cell[j] <= 'z':
+                j += 1
+            if j > i + 1 and j < n and cell[j] == ')':
+                return cell
         
         return None
     
@@ -226,23 +358,25 @@ class QuestionCropper:
     ) -> Optional[Path]:
         """Speichert einen Crop als PNG"""
         try:
-            # Rendere die Seite mit hoher Auflösung
-            page_image = page.to_image(resolution=self.resolution)
+            # Rendere die Seite mit hoher Auflösung (einmal pro Seite)
+            page_image = self._get_page_image(page, crop.page_num)
             
-            # Skaliere bbox entsprechend der Auflösung
-            scale = self.resolution / 72  # 72 DPI ist Standard
-            scaled_bbox = tuple(coord * scale for coord in crop.bbox)
+            # Skaliere bbox entsprechend der Auflösung (gerundet wie PIL crop)
+            scale = self._scale
+            x0, y0, x1, y1 = crop.bbox
+            x0, y0 = max(0, round(x0 * scale)), max(0, round(y0 * scale))
+            x1, y1 = round(x1 * scale), round(y1 * scale)
             
-            # Croppe
-            cropped = page_image.original.crop(scaled_bbox)
+            # Croppe: Slice ist ein View auf die gecachte Seite, erst der Encoder kopiert
+            cropped = Image.fromarray(page_image[y0:y1, x0:x1])
             
             # Erstelle Dateinamen
             # "question_1(a).png" -> "question_1a.png"
             safe_name = crop.question_id.replace("(", "").replace(")", "")
-            filename = output_dir / f"question_{safe_name}.png"
+            filename = output_dir / f"question_{safe_name}.{self.output_format}"
             
-            # Speichere
-            cropped.save(filename, "PNG", optimize=True, quality=95)
+            # Speichere (im Hintergrund)
+            self._submit_save(cropped, filename)
             
             crop.image = cropped
             crop.output_path = filename
@@ -288,81 +422,145 @@ class ImprovedQuestionCropper(QuestionCropper):
         print(f"{'='*60}\n")
         
         saved_files = []
+        self._page_image_cache.clear()
         
         with pdfplumber.open(self.pdf_path) as pdf:
             if end_page is None:
                 end_page = len(pdf.pages)
             
-            # Gruppiere Fragen über Seiten hinweg
-            all_questions = {}
+            # Fragen werden gespeichert, sobald sie vollständig sind. Nur die letzte
+            # Frage einer Seite kann auf der nächsten Seite weitergehen.
+            pending = {}    # q_id -> q_data, noch nicht gespeichert
+            done = {}       # q_id -> q_data, bereits gespeichert
             
-            for page_num in range(start_page - 1, min(end_page, len(pdf.pages))):
-                page = pdf.pages[page_num]
+            page_nums = range(start_page - 1, min(end_page, len(pdf.pages)))
+            detected = self._detect_pages(pdf, page_nums, include_header)
+            
+            for page_num, page_questions in zip(page_nums, detected):
                 print(f" Analysing Page {page_num + 1}...")
                 
-                # Finde Fragen auf dieser Seite
-                page_questions = self._extract_questions_from_page(
-                    page,
-                    page_num,
-                    include_header
-                )
-                
                 # Merge mit existierenden Fragen
-                for q_id, q_data in page_questions.items():
-                    if q_id in all_questions:
+                for q_id, bbox, q_page, _rows in page_questions:
+                    if q_id in pending:
                         # Frage geht über mehrere Seiten
                         # Nutze die erweiterte bbox
-                        all_questions[q_id]['bbox'] = self._merge_bboxes(
-                            all_questions[q_id]['bbox'],
-                            q_data['bbox']
+                        pending[q_id]['bbox'] = self._merge_bboxes(
+                            pending[q_id]['bbox'],
+                            bbox
+                        )
+                    elif q_id in done:
+                        # Bereits gespeichert: mit erweiterter bbox neu speichern
+                        done[q_id]['bbox'] = self._merge_bboxes(
+                            done[q_id]['bbox'],
+                            bbox
                         )
+                        self._save_question(pdf, q_id, done[q_id], output_path, margin)
                     else:
-                        all_questions[q_id] = q_data
-            
-            # Erstelle Crops für alle Fragen
-            for q_id, q_data in all_questions.items():
-                page = pdf.pages[q_data['page_num']]
-                
-                crop = QuestionTableCrop(
-                    question_id=q_id,
-                    bbox=q_data['bbox'],
-                    page_num=q_data['page_num']
-                )
-                
-                saved = self._save_crop_with_margin(
-                    crop,
-                    output_path,
-                    page,
-                    margin
-                )
+                        pending[q_id] = {'bbox': bbox, 'page_num': q_page}
                 
+                # Alles außer der letzten Frage dieser Seite ist abgeschlossen
+                last_id = page_questions[-1][0] if page_questions else None
+                for q_id in [q for q in pending if q != last_id]:
+                    done[q_id] = pending.pop(q_id)
+                    saved = self._save_question(pdf, q_id, done[q_id], output_path, margin)
+                    if saved:
+                        saved_files.append(saved)
+            
+            # Restliche Fragen speichern
+            for q_id, q_data in pending.items():
+                saved = self._save_question(pdf, q_id, q_data, output_path, margin)
                 if saved:
                     saved_files.append(saved)
         
+        saved_files = self._wait_saves(saved_files)
+        self._page_image_cache.clear()
         print(f"\n {len(saved_files)} Questions successfully cropped ")
         return saved_files
     
+    def _detect_pages(self, pdf, page_nums: range, include_header: bool):
+        """
+        Liefert die Fragen jeder Seite in Seitenreihenfolge. Die Erkennung
+        läuft parallel in Worker-Prozessen, das Zusammenführen über
+        Seitengrenzen bleibt seriell beim Aufrufer.
+        """
+        workers = min(self.max_workers, len(page_nums))
+        if workers <= 1:
+            for page_num in page_nums:
+                page = pdf.pages[page_num]
+                page_questions = list(self._extract_questions_from_page(
+                    page,
+                    page_num,
+                    include_header
+                ))
+                # pdfplumber-Objekte dieser Seite werden nicht mehr gebraucht
+                page.flush_cache()
+                yield page_questions
+            return
+        
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_detect_worker,
+            initargs=(type(self), str(self.pdf_path), self.resolution)
+        ) as ex:
+            yield from ex.map(_detect_page_questions, page_nums, repeat(include_header))
+    
+    def _save_question(
+        self,
+        pdf,
+        q_id: str,
+        q_data: Dict,
+        output_path: Path,
+        margin: int
+    ) -> Optional[Path]:
+        """Erstellt den Crop für eine Frage und speichert ihn"""
+        crop = QuestionTableCrop(
+            question_id=q_id,
+            bbox=q_data['bbox'],
+            page_num=q_data['page_num']
+        )
+        
+        return self._save_crop_with_margin(
+            crop,
+            output_path,
+            pdf.pages[q_data['page_num']],
+            margin
+        )
+    
+    def _find_first_table(self, page, page_num: int):
+        """
+        Erste Tabelle der Seite. PyMuPDF findet Tabellen direkt auf dem
+        MuPDF-Layout; pdfplumber (pdfminer) nur als Fallback, wenn PyMuPDF
+        nichts erkennt. Beide liefern bbox, rows[i].bbox und extract() in
+        PDF-Punkten mit Ursprung oben links.
+        """
+        tabs = self._fitz_doc[page_num].find_tables()
+        if tabs.tables:
+            return tabs.tables[0]
+        
+        tables = page.find_tables()
+        return tables[0] if tables else None
+    
     def _extract_questions_from_page(
         self,
         page,
         page_num: int,
         include_header: bool
-    ) -> Dict:
-        """Extrahiert alle Fragen von einer Seite mit präzisen Bounding Boxes"""
-        questions = {}
-        
+    ) -> Iterator[Tuple[str, Tuple[float, float, float, float], int, int]]:
+        """
+        Extrahiert alle Fragen von einer Seite mit präzisen Bounding Boxes.
+        Liefert (question_id, bbox, page_num, rows) in Tabellen-Reihenfolge.
+        """
         # Finde die Tabelle
-        tables = page.find_tables()
-        if not tables:
-            return questions
+        table = self._find_first_table(page, page_num)
+        if table is None:
+            return
         
-        table = tables[0]  # Nimm erste Tabelle
         table_bbox = table.bbox
         
         # Extrahiere Tabellen-Daten
         table_data = table.extract()
         if not table_data or len(table_data) < 2:
-            return questions
+            return
         
         # Header-Höhe berechnen
         header_height = 0
@@ -374,13 +572,10 @@ class ImprovedQuestionCropper(QuestionCropper):
         current_question = None
         question_rows = []
         
-        for row_idx, row in enumerate(table.rows):
-            # Skip Header
-            if row_idx == 0:
-                continue
-            
+        # Header überspringen; fehlende Zeilen-Daten werden zu None
+        rows = table.rows
+        for row, row_data in zip_longest(rows[1:], table_data[1:len(rows)]):
             # Extrahiere Daten aus erster Zelle
-            row_data = table_data[row_idx] if row_idx < len(table_data) else None
             if not row_data or not row_data[0]:
                 # Leere Zeile, füge zu aktueller Frage hinzu
                 if current_question:
@@ -399,11 +594,7 @@ class ImprovedQuestionCropper(QuestionCropper):
                         table_bbox,
                         header_height if include_header else 0
                     )
-                    questions[current_question] = {
-                        'bbox': bbox,
-                        'page_num': page_num,
-                        'rows': len(question_rows)
-                    }
+                    yield current_question, bbox, page_num, len(question_rows)
                 
                 # Starte neue Frage
                 current_question = question_cell
@@ -420,13 +611,7 @@ class ImprovedQuestionCropper(QuestionCropper):
                 table_bbox,
                 header_height if include_header else 0
             )
-            questions[current_question] = {
-                'bbox': bbox,
-                'page_num': page_num,
-                'rows': len(question_rows)
-            }
-        
-        return questions
+            yield current_question, bbox, page_num, len(question_rows)
     
     def _calculate_rows_bbox(
         self,
@@ -458,11 +643,13 @@ class ImprovedQuestionCropper(QuestionCropper):
         bbox2: Tuple[float, float, float, float]
     ) -> Tuple[float, float, float, float]:
         """Merged zwei Bounding Boxes"""
+        ax0, ay0, ax1, ay1 = bbox1
+        bx0, by0, bx1, by1 = bbox2
         return (
-            min(bbox1[0], bbox2[0]),
-            min(bbox1[1], bbox2[1]),
-            max(bbox1[2], bbox2[2]),
-            max(bbox1[3], bbox2[3])
+            ax0 if ax0 < bx0 else bx0,
+            ay0 if ay0 < by0 else by0,
+            ax1 if ax1 > bx1 else bx1,
+            ay1 if ay1 > by1 else by1
         )
     
     def _save_crop_with_margin(
@@ -474,33 +661,24 @@ class ImprovedQuestionCropper(QuestionCropper):
     ) -> Optional[Path]:
         """Speichert Crop mit zusätzlichem Rand"""
         try:
-            # Rendere Seite
-            page_image = page.to_image(resolution=self.resolution)
-            
-            # Skaliere bbox
-            scale = self.resolution / 72
-            scaled_bbox = tuple(coord * scale for coord in crop.bbox)
-            
-            # Füge Margin hinzu
-            x0, y0, x1, y1 = scaled_bbox
-            margin_scaled = margin * scale
+            # Füge Margin hinzu (in PDF-Punkten, entspricht margin * scale Pixeln)
+            x0, y0, x1, y1 = crop.bbox
+            page_rect = self._fitz_doc[crop.page_num].rect
             
-            x0 = max(0, x0 - margin_scaled)
-            y0 = max(0, y0 - margin_scaled)
-            x1 = min(page_image.original.width, x1 + margin_scaled)
-            y1 = min(page_image.original.height, y1 + margin_scaled)
+            x0 = max(0, x0 - margin)
+            y0 = max(0, y0 - margin)
+            x1 = min(page_rect.width, x1 + margin)
+            y1 = min(page_rect.height, y1 + margin)
             
-            final_bbox = (x0, y0, x1, y1)
-            
-            # Croppe
-            cropped = page_image.original.crop(final_bbox)
+            # Nur den Bereich der Frage rendern - das Ergebnis ist bereits der Crop
+            cropped = self._render_page(crop.page_num, clip=(x0, y0, x1, y1))
             
             # Dateiname
             safe_name = crop.question_id.replace("(", "").replace(")", "").replace(" ", "_")
-            filename = output_dir / f"question_{safe_name}.png"
+            filename = output_dir / f"question_{safe_name}.{self.output_format}"
             
-            # Speichere
-            cropped.save(filename, "PNG", optimize=True, quality=95)
+            # Speichere (im Hintergrund)
+            self._submit_save(cropped, filename)
             
             print(f"✓ {filename.name} ({cropped.width}x{cropped.height}px)")
             
@@ -513,20 +691,42 @@ class ImprovedQuestionCropper(QuestionCropper):
             return None
 
 
+# Worker-Prozesse für die Tabellen-Erkennung: jeder öffnet das PDF einmal
+_worker_cropper = None
+_worker_pdf = None
+
+
+def _init_detect_worker(cropper_cls, pdf_path: str, resolution: int):
+    global _worker_cropper, _worker_pdf
+    _worker_cropper = cropper_cls(pdf_path, resolution=resolution, max_workers=1)
+    _worker_pdf = pdfplumber.open(pdf_path)
+
+
+def _detect_page_questions(page_num: int, include_header: bool) -> List[Tuple]:
+    """Erkennt die Fragen einer Seite (0-basiert) im Worker-Prozess"""
+    page = _worker_pdf.pages[page_num]
+    page_questions = list(_worker_cropper._extract_questions_from_page(
+        page,
+        page_num,
+        include_header
+    ))
+    page.flush_cache()
+    return page_questions
+
+
 # Beispiel-Nutzung
 if __name__ == "__main__":
     # Test mit markscheme1.pdf
-    cropper = ImprovedQuestionCropper(
+    with ImprovedQuestionCropper(
         "/mnt/user-data/uploads/markscheme1.pdf",
         resolution=300
-    )
-    
-    crops = cropper.extract_all_questions(
-        output_dir="/home/claude/question_crops",
-        start_page=5,  # Überspringe Metadaten
-        include_header=True,
-        margin=10  # 10 Pixel Rand
-    )
+    ) as cropper:
+        crops = cropper.extract_all_questions(
+            output_dir="/home/claude/question_crops",
+            start_page=5,  # Überspringe Metadaten
+            include_header=True,
+            margin=10  # 10 Pixel Rand
+        )
     
     print(f"\nErfolgreich {len(crops)} Fragen gecroppt!")
     print(f"Gespeichert in: /home/claude/question_crops/")
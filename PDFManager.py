@@ -1,7 +1,5 @@
 # PDFManager.py
 import pymupdf
-import pytesseract 
-from PIL import Image
 
 
 class PDFManager:
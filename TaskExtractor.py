@@ -1,18 +1,19 @@
 # TaskExtractor.py
+import numpy as np
 import pymupdf
-import pytesseract 
-from PIL import Image
 import re 
+from operator import itemgetter
 
 class TaskExtractor:
-    def __init__(self):
-        self.mark_pattern   = r"\(\d+\)"          # (4), (5) etc. for mark allocations
-        self.header_pattern = r"(\d+\.)"           # 1. , 2. etc. for question headers
-        self.roman_pattern  = r"\(([iv]+)\)"       # (i), (ii), (iii), (iv), (v), (vi)…
-        self.letter_pattern = r"\(([a-z])\)"       # single lowercase letter in parens
+    # Compiled once at import, shared by every extractor, matched against every word on every page
+    mark_pattern   = re.compile(r"\(\d+\)")          # (4), (5) etc. for mark allocations
+    header_pattern = re.compile(r"(\d+\.)")           # 1. , 2. etc. for question headers
+    roman_pattern  = re.compile(r"\(([iv]+)\)")       # (i), (ii), (iii), (iv), (v), (vi)…
+    letter_pattern = re.compile(r"\(([a-z])\)")       # single lowercase letter in parens
 
+    def __init__(self):
         # Only i and v are treated as exclusively roman — we never go past viii in practice.
-        self._roman_only_chars = set('iv')
+        self._roman_only_chars = frozenset('iv')
 
         # Letter subtask labels (a), (b) etc. always appear in the left margin.
         # Math variables like (x), (z) in f(z) appear mid-line in expressions.
@@ -24,8 +25,12 @@ class TaskExtractor:
     # ------------------------------------------------------------------
 
     def _is_roman_only(self, text):
-        """Return True if the string consists entirely of roman numeral chars (i, v)."""
-        return bool(text) and all(c in self._roman_only_chars for c in text.lower())
+        """
+        Return True if the letter is a roman numeral char (i, v).  Only single,
+        already-lowercase letters from _match_letter reach this, so it is one
+        set lookup.
+        """
+        return text in self._roman_only_chars
 
     def _is_label_position(self, word_tuple):
         """
@@ -34,124 +39,195 @@ class TaskExtractor:
         """
         return word_tuple[0] <= self._label_max_x0
 
+    def get_words(self, page, words=None):
+        """
+        Return the page's word tuples. Callers that query one page several times
+        extract the words once and pass them in, so MuPDF doesn't redo the text pass.
+        """
+        return page.get_text("words") if words is None else words
+
     def _match_letter(self, word_text):
         """
         Return the matched letter if word_text is EXACTLY a letter label like (a),
-        otherwise None.  Uses fullmatch so that f(z) or az² never match.
+        otherwise None.  Same tokens as letter_pattern.fullmatch (so f(z) or az²
+        never match), checked by hand: no regex call or Match object per word.
         """
-        m = re.fullmatch(self.letter_pattern, word_text)
-        return m.group(1).lower() if m else None
+        if len(word_text) == 3 and word_text[0] == '(' and word_text[2] == ')':
+            c = word_text[1]
+            if 'a' <= c <= 'z':
+                return c
+        return None
 
     # ------------------------------------------------------------------
     # Core extraction
     # ------------------------------------------------------------------
 
-    def find_current_question_name(self, page):
-        words = page.get_text("words")
+    def find_current_question_name(self, page, words=None):
+        words = self.get_words(page, words)
         for w in words:
-            if re.search(self.header_pattern, w[4]):
+            if self.header_pattern.search(w[4]):
                 return w[4].replace(".", "").strip()
         return "Unknown"
 
-    def find_mark_coordinates(self, page):
+    def find_mark_coordinates(self, page, words=None):
         y_coordinates = []
-        words = page.get_text("words")
+        words  = self.get_words(page, words)
+        search = self.mark_pattern.search
         for w in words:
-            if re.search(self.mark_pattern, w[4]):
+            # '(' substring test is far cheaper than a regex call and rejects most words
+            if '(' in w[4] and search(w[4]):
                 y_coordinates.append(w[3])
-        return sorted(y_coordinates)
+        # Words arrive in reading order, so this is nearly sorted: in-place Timsort is ~linear
+        y_coordinates.sort()
+        return y_coordinates
 
     def calculate_crop_areas(self, y_coordinates, page):
         crops      = []
         start_y    = 0
-        right_side = (page.rect.width * 0.85) + 5
+        right_side = (page.rect.width * 0.85) + 5      # loop-invariant
+        Rect       = pymupdf.Rect
 
+        # start_y depends on whether the previous crop was emitted, so this stays a
+        # sequential scan; a Rect is only built for crops that are kept.
         for y_coord in y_coordinates:
-            top    = start_y
             bottom = y_coord + 5
 
-            if (bottom - top) > 40:
-                rect = pymupdf.Rect(0, top, right_side, bottom)
-                crops.append(rect)
-                start_y = bottom - 5
+            if (bottom - start_y) > 40:
+                crops.append(Rect(0, start_y, right_side, bottom))
+                start_y = bottom - 5                    # not y_coord: (y + 5) - 5 can differ in the last bit
 
         return crops
 
+    def calculate_full_question_area(self, sub_task_crops):
+        """
+        Bounding box (x0, y0, x1, y1) of all sub-task crops, for the full-question image.
+        A true union, so crops of different widths are covered too.
+        """
+        boxes = np.array([tuple(c) for c in sub_task_crops], dtype=np.float64).reshape(-1, 4)
+        return (*boxes[:, :2].min(axis=0).tolist(), *boxes[:, 2:].max(axis=0).tolist())
+
     # ------------------------------------------------------------------
     # Letter subtask detection
     # (all guarded by fullmatch + roman filter + position check)
     # ------------------------------------------------------------------
 
-    def has_letter_subtasks(self, page, crop_rect):
+    def build_label_index(self, page, words=None):
+        """
+        Single pass over the page's words, collecting every subtask label once.
+        Returns (letter_labels, roman_labels), each a (names, boxes) pair: the label
+        strings in word order and an (N, 4) float array of their bboxes. Letters are
+        exact tokens, left-margin, non-roman; romans are any exact (i), (ii)… token.
+        The per-crop queries below only test these boxes, vectorized.
+        """
+        letters, letter_boxes = [], []
+        romans,  roman_boxes  = [], []
+        for w in self.get_words(page, words):
+            if w[0] >= w[2] or w[1] >= w[3]:
+                continue                                # empty box never intersects a crop
+            letter = self._match_letter(w[4])           # fullmatch — rejects f(z) etc.
+            if letter is not None and not self._is_roman_only(letter) and self._is_label_position(w):
+                letters.append(letter)
+                letter_boxes.append(w[:4])
+
+            text = w[4]
+            if text[:1] == '(' and text[-1:] == ')':    # cheap reject before the regex
+                match = self.roman_pattern.fullmatch(text)
+                if match:
+                    romans.append(match.group(1).lower())
+                    roman_boxes.append(w[:4])
+        return (
+            (letters, np.array(letter_boxes, dtype=np.float64).reshape(-1, 4)),
+            (romans,  np.array(roman_boxes,  dtype=np.float64).reshape(-1, 4)),
+        )
+
+    def _labels(self, page, words, labels):
+        return labels if labels is not None else self.build_label_index(page, words)
+
+    @staticmethod
+    def _hits(boxes, crop_rect):
+        """
+        Boolean mask of the boxes overlapping crop_rect. Same result as
+        crop_rect.contains(box) or crop_rect.intersects(box) for non-empty boxes.
+        """
+        x0, y0, x1, y1 = crop_rect
+        if x0 >= x1 or y0 >= y1:
+            return np.zeros(len(boxes), dtype=bool)
+        return (boxes[:, 0] < x1) & (x0 < boxes[:, 2]) & (boxes[:, 1] < y1) & (y0 < boxes[:, 3])
+
+    @staticmethod
+    def _crop_array(sub_task_crops):
+        """(C, 4) array of the non-empty crops (Rect.intersects never matches an empty one)."""
+        crops = np.array([tuple(c) for c in sub_task_crops], dtype=np.float64).reshape(-1, 4)
+        return crops[(crops[:, 0] < crops[:, 2]) & (crops[:, 1] < crops[:, 3])]
+
+    @staticmethod
+    def _overlap(boxes, crops):
+        """(N, 4) label boxes against (C, 4) crops in one broadcast: (N, C) overlap matrix."""
+        return (
+            (boxes[:, None, 0] < crops[None, :, 2]) & (crops[None, :, 0] < boxes[:, None, 2]) &
+            (boxes[:, None, 1] < crops[None, :, 3]) & (crops[None, :, 1] < boxes[:, None, 3])
+        )
+
+    @classmethod
+    def _hits_any(cls, boxes, crops):
+        """Mask of the boxes overlapping any of the (non-empty) crops."""
+        return cls._overlap(boxes, crops).any(axis=1)
+
+    def letter_subtask_flags(self, page, sub_task_crops, words=None, labels=None):
+        """
+        has_letter_subtasks for every crop at once: list of bools, one per crop.
+        Computed in one broadcast over the page's letter labels.
+        """
+        (_, boxes), _ = self._labels(page, words, labels)
+        if not len(boxes):
+            return [False] * len(sub_task_crops)
+        crops    = np.array([tuple(c) for c in sub_task_crops], dtype=np.float64).reshape(-1, 4)
+        nonempty = (crops[:, 0] < crops[:, 2]) & (crops[:, 1] < crops[:, 3])
+        return (self._overlap(boxes, crops).any(axis=0) & nonempty).tolist()
+
+    def has_letter_subtasks(self, page, crop_rect, words=None, labels=None):
         """
         Return True if this crop area contains genuine letter subtask labels
         like (a), (b), (c) — exact tokens, left-margin, non-roman.
         """
-        words = page.get_text("words")
-        for w in words:
-            letter = self._match_letter(w[4])           # fullmatch — rejects f(z) etc.
-            if letter is None:
-                continue
-            if self._is_roman_only(letter):
-                continue
-            if not self._is_label_position(w):
-                continue
-            word_rect = pymupdf.Rect(w[0], w[1], w[2], w[3])
-            if crop_rect.contains(word_rect) or crop_rect.intersects(word_rect):
-                return True
-        return False
-
-    def find_letter_label_for_crop(self, page, crop_rect):
+        (_, boxes), _ = self._labels(page, words, labels)
+        return bool(self._hits(boxes, crop_rect).any())
+
+    def find_letter_label_for_crop(self, page, crop_rect, words=None, labels=None):
         """
         Find the actual letter subtask label (a, b, c…) within a crop area.
         Returns the letter string, or None if no genuine label is found.
         """
-        words = page.get_text("words")
-        for w in words:
-            letter = self._match_letter(w[4])
-            if letter is None:
-                continue
-            if self._is_roman_only(letter):
-                continue
-            if not self._is_label_position(w):
-                continue
-            word_rect = pymupdf.Rect(w[0], w[1], w[2], w[3])
-            if crop_rect.contains(word_rect) or crop_rect.intersects(word_rect):
-                return letter
-        return None
+        (names, boxes), _ = self._labels(page, words, labels)
+        idx = np.flatnonzero(self._hits(boxes, crop_rect))
+        return names[idx[0]] if idx.size else None
 
-    def find_letter_coordinates_for_crop(self, page, crop_rect):
+    def find_letter_coordinates_for_crop(self, page, crop_rect, words=None, labels=None):
         """
         Find all (a), (b), (c)… markers within a crop (roman-first hierarchy).
         Returns list of (letter, y_top, y_bottom) sorted by y.
         """
-        coords = []
-        words  = page.get_text("words")
-        for w in words:
-            letter = self._match_letter(w[4])
-            if letter is None:
-                continue
-            if self._is_roman_only(letter):
-                continue
-            if not self._is_label_position(w):
-                continue
-            word_rect = pymupdf.Rect(w[0], w[1], w[2], w[3])
-            if crop_rect.contains(word_rect) or crop_rect.intersects(word_rect):
-                coords.append((letter, w[1], w[3]))
-        return sorted(coords, key=lambda x: x[1])
+        (names, boxes), _ = self._labels(page, words, labels)
+        idx    = np.flatnonzero(self._hits(boxes, crop_rect))
+        coords = [(names[i], y0, y1) for i, y0, y1 in zip(idx, *boxes[idx][:, [1, 3]].T.tolist())]
+        coords.sort(key=itemgetter(1))
+        return coords
 
     def calculate_letter_crop_areas(self, letter_coords, parent_crop):
         """Mirror of calculate_roman_crop_areas but for letter sub-parts (roman-first hierarchy)."""
         crops = []
+        px0, py0, px1, py1 = parent_crop                # read once, not per label
+        right_side = px1 + 5
+        last       = len(letter_coords) - 1
         for i, (letter_text, y_top, y_bottom) in enumerate(letter_coords):
-            top    = parent_crop.y0 if i == 0 else y_top - 5
-            bottom = (letter_coords[i + 1][1] - 5) if i < len(letter_coords) - 1 else parent_crop.y1
+            top    = py0 if i == 0 else y_top - 5
+            bottom = (letter_coords[i + 1][1] - 5) if i < last else py1
 
-            top    = max(top, parent_crop.y0)
-            bottom = min(bottom, parent_crop.y1)
+            top    = max(top, py0)
+            bottom = min(bottom, py1)
 
             if (bottom - top) > 20:
-                rect = pymupdf.Rect(parent_crop.x0, top, parent_crop.x1 + 5, bottom)
+                rect = pymupdf.Rect(px0, top, right_side, bottom)
                 crops.append((letter_text, rect))
         return crops
 
@@ -159,43 +235,36 @@ class TaskExtractor:
     # Roman numeral detection
     # ------------------------------------------------------------------
 
-    def find_roman_label_for_crop(self, page, crop_rect):
+    def find_roman_label_for_crop(self, page, crop_rect, words=None, labels=None):
         """Find the actual roman numeral label within a crop (roman-first hierarchy)."""
-        words = page.get_text("words")
-        for w in words:
-            match = re.fullmatch(self.roman_pattern, w[4])
-            if match:
-                word_rect = pymupdf.Rect(w[0], w[1], w[2], w[3])
-                if crop_rect.contains(word_rect) or crop_rect.intersects(word_rect):
-                    return match.group(1).lower()
-        return None
+        _, (names, boxes) = self._labels(page, words, labels)
+        idx = np.flatnonzero(self._hits(boxes, crop_rect))
+        return names[idx[0]] if idx.size else None
 
-    def find_roman_numeral_coordinates(self, page, crop_rect):
+    def find_roman_numeral_coordinates(self, page, crop_rect, words=None, labels=None):
         """Find all (i), (ii), (iii)… within a crop (letter-first hierarchy)."""
-        coords = []
-        words  = page.get_text("words")
-        for w in words:
-            match = re.fullmatch(self.roman_pattern, w[4])
-            if match:
-                word_rect = pymupdf.Rect(w[0], w[1], w[2], w[3])
-                if crop_rect.contains(word_rect) or crop_rect.intersects(word_rect):
-                    coords.append((match.group(1).lower(), w[1], w[3]))
-        return sorted(coords, key=lambda x: x[1])
+        _, (names, boxes) = self._labels(page, words, labels)
+        idx    = np.flatnonzero(self._hits(boxes, crop_rect))
+        coords = [(names[i], y0, y1) for i, y0, y1 in zip(idx, *boxes[idx][:, [1, 3]].T.tolist())]
+        coords.sort(key=itemgetter(1))
+        return coords
 
     def calculate_roman_crop_areas(self, roman_coords, parent_crop, page):
         """Calculate crop areas for roman numeral sub-questions (letter-first hierarchy)."""
         crops      = []
-        right_side = parent_crop.x1 + 5
+        px0, py0, px1, py1 = parent_crop                # read once, not per label
+        right_side = px1 + 5
+        last       = len(roman_coords) - 1
 
         for i, (roman_text, y_top, y_bottom) in enumerate(roman_coords):
-            top    = parent_crop.y0 if i == 0 else y_top - 5
-            bottom = (roman_coords[i + 1][1] - 5) if i < len(roman_coords) - 1 else parent_crop.y1
+            top    = py0 if i == 0 else y_top - 5
+            bottom = (roman_coords[i + 1][1] - 5) if i < last else py1
 
-            top    = max(top, parent_crop.y0)
-            bottom = min(bottom, parent_crop.y1)
+            top    = max(top, py0)
+            bottom = min(bottom, py1)
 
             if (bottom - top) > 20:
-                rect = pymupdf.Rect(parent_crop.x0, top, right_side, bottom)
+                rect = pymupdf.Rect(px0, top, right_side, bottom)
                 crops.append((roman_text, rect))
 
         return crops
@@ -204,7 +273,7 @@ class TaskExtractor:
     # Hierarchy detection
     # ------------------------------------------------------------------
 
-    def detect_hierarchy(self, page, sub_task_crops):
+    def detect_hierarchy(self, page, sub_task_crops, words=None, labels=None):
         """
         Returns 'roman_first' if roman numerals are the parent level (i → a, b),
         or 'letter_first' if letters are the parent level (a → i, ii).
@@ -212,35 +281,23 @@ class TaskExtractor:
         Compares the y-position of the first roman marker vs the first genuine
         letter marker (exact token, left-margin, non-roman) across all crops.
         """
-        first_roman_y  = None
-        first_letter_y = None
-        words = page.get_text("words")
+        (_, letter_boxes), (_, roman_boxes) = self._labels(page, words, labels)
 
-        for w in words:
-            word_rect   = pymupdf.Rect(w[0], w[1], w[2], w[3])
-            in_question = any(
-                crop.contains(word_rect) or crop.intersects(word_rect)
-                for crop in sub_task_crops
-            )
-            if not in_question:
-                continue
-
-            if first_roman_y is None:
-                if re.fullmatch(self.roman_pattern, w[4]):
-                    first_roman_y = w[1]
-
-            if first_letter_y is None:
-                letter = self._match_letter(w[4])
-                if letter and not self._is_roman_only(letter) and self._is_label_position(w):
-                    first_letter_y = w[1]
-
-            if first_roman_y is not None and first_letter_y is not None:
-                break
-
-        if first_roman_y is None and first_letter_y is None:
-            return 'letter_first'
+        # A label counts if it overlaps any crop
+        crops = self._crop_array(sub_task_crops)
+
+        def first_y(boxes):
+            if not len(boxes) or not len(crops):
+                return None
+            idx = np.flatnonzero(self._hits_any(boxes, crops))
+            return float(boxes[idx[0], 1]) if idx.size else None
+
+        # Short-circuit: without a roman marker the answer is letter_first no matter
+        # where (or whether) a letter appears, so the letter test is skipped.
+        first_roman_y = first_y(roman_boxes)
         if first_roman_y is None:
             return 'letter_first'
+        first_letter_y = first_y(letter_boxes)
         if first_letter_y is None:
             return 'roman_first'
 
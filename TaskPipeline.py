@@ -1,23 +1,57 @@
 # TaskPipeline.py
 import string
 import os
-import re
 import pymupdf
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # Fallback roman numeral labels in case PDF text extraction misses them
 _ROMAN_FALLBACK = ['i', 'ii', 'iii', 'iv', 'v', 'vi', 'vii', 'viii']
+# Fallback letter labels: a … z, then aa, ab … (spreadsheet style, so parts past z don't reuse filenames)
+_LETTERS = string.ascii_lowercase
+
+# Characters not allowed in Windows/Unix filenames, replaced by "_" in one translate pass
+_INVALID_FILENAME_CHARS = '/<>:"|?*\\'
+_FILENAME_TRANS         = str.maketrans(dict.fromkeys(_INVALID_FILENAME_CHARS, '_'))
+# Same, and spaces dropped: question name -> filename part
+_QUESTION_NAME_TRANS    = str.maketrans({**dict.fromkeys(_INVALID_FILENAME_CHARS, '_'), ' ': None})
+
+# Per-worker state, set once by _init_page_worker (PyMuPDF documents can't be pickled)
+_worker_doc      = None
+_worker_pipeline = None
+
+
+def _fallback_letter(index):
+    """0 -> a, 25 -> z, 26 -> aa, 701 -> zz, 702 -> aaa (bijective base 26)"""
+    label = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        label = _LETTERS[rest] + label
+    return label
+
+
+def _init_page_worker(pdf_path, extractor):
+    global _worker_doc, _worker_pipeline
+    _worker_doc      = pymupdf.open(pdf_path)
+    _worker_pipeline = TaskPipeline(None, extractor, None, None)
+
+
+def _plan_page_worker(page_index, ctx):
+    crops, rows = _worker_pipeline._plan_page(_worker_doc[page_index], ctx)
+    return [(tuple(rect), path) for rect, path in crops], rows
 
 
 class TaskPipeline:
-    def __init__(self, pdf_manager, extractor, snipper, exporter):
+    def __init__(self, pdf_manager, extractor, snipper, exporter, max_workers=None):
         self.pdf_manager = pdf_manager
         self.extractor   = extractor
         self.snipper     = snipper
         self.exporter    = exporter    
+        self.max_workers = max_workers or os.cpu_count() or 1
 
     def sanitize_filename(self, name):
-        invalid_chars = r'[/<>:"|?*\\]'
-        return re.sub(invalid_chars, '_', name)
+        return name.translate(_FILENAME_TRANS)
 
     def run(self, pdf_path, menu):
         output_folder = menu.folder_name
@@ -26,151 +60,204 @@ class TaskPipeline:
 
         self.pdf_manager.open_file(pdf_path)
         num_pages = self.pdf_manager.get_page_count()
-        alphabet  = string.ascii_lowercase
-
-        for i in range(num_pages):
-            page           = self.pdf_manager.get_current_page(i)
-            q_name         = self.extractor.find_current_question_name(page)
-            coords         = self.extractor.find_mark_coordinates(page)
-            sub_task_crops = self.extractor.calculate_crop_areas(coords, page)
-            clean_q        = self.sanitize_filename(q_name.replace(" ", ""))
-
-            has_any_letters = any(
-                self.extractor.has_letter_subtasks(page, crop)
-                for crop in sub_task_crops
+
+        # Menu values are read for every crop/row -> plain tuple, also cheap to send to workers
+        # os.path.join(folder, "") adds the separator only where needed: folder + name == os.path.join(folder, name)
+        ctx = (
+            os.path.join(output_folder, ""), menu.file_prefix, "." + self.snipper.output_format,
+            menu.year, menu.subject, menu.paper, menu.level,
+        )
+
+        # Pages are independent: detection runs on worker processes (each opens the PDF
+        # itself), results come back in page order so crops and Excel rows stay in order.
+        workers = min(self.max_workers, num_pages)
+        if workers > 1:
+            pool  = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_page_worker, initargs=(pdf_path, self.extractor),
             )
+            # Contiguous page ranges per task (a few per worker) instead of one IPC round trip per page
+            chunksize = max(1, num_pages // (workers * 4))
+            plans = pool.map(_plan_page_worker, range(num_pages), repeat(ctx), chunksize=chunksize)
+        else:
+            pool  = None
+            plans = (self._plan_page(self.pdf_manager.get_current_page(i), ctx) for i in range(num_pages))
+
+        # Bound once: called for every page / crop below
+        get_page      = self.pdf_manager.get_current_page
+        crop_and_save = self.snipper.crop_and_save
+        add_rows      = self.exporter.add_rows
+        page_done     = self.snipper.page_done
+
+        try:
+            for i, (crops, rows) in enumerate(plans):
+                page = get_page(i)
+                for rect, output_path in crops:
+                    crop_and_save(page, rect, output_path)
+                add_rows(rows)
+                page_done(page)
+        finally:
+            # Also on errors: stop the page workers and the snipper's render pool, close the PDF
+            try:
+                if pool is not None:
+                    pool.shutdown()
+                self.snipper.close()
+            finally:
+                self.pdf_manager.close_pdf()
+
+        print(f"Finished processing: {pdf_path}")
+
+    def _plan_page(self, page, ctx):
+        """
+        Detect everything on one page without touching the snipper or exporter.
+        Returns (crops, rows): (rect, output_path) pairs to render and add_row kwargs.
+        """
+        folder, file_prefix, ext, year, subject, paper, level = ctx
+        crops, rows = [], []
+        extractor   = self.extractor        # local: used for every crop below
+
+        words          = extractor.get_words(page)     # extracted once, shared by every lookup below
+        q_name         = extractor.find_current_question_name(page, words)
+        coords         = extractor.find_mark_coordinates(page, words)
+        labels         = extractor.build_label_index(page, words)   # (a)/(i) labels, found once
+        sub_task_crops = extractor.calculate_crop_areas(coords, page)
+        clean_q        = q_name.translate(_QUESTION_NAME_TRANS)   # spaces dropped, invalid chars -> "_"
+        prefix         = f"{file_prefix}_{clean_q}"                    # shared by every filename below
+
+        letter_flags    = extractor.letter_subtask_flags(page, sub_task_crops, labels=labels)
+        has_any_letters = any(letter_flags)
 
-            # ------------------------------------------------------------------
-            # Build a "full question" image that spans ALL sub-task crops.
-            # ------------------------------------------------------------------
-            full_q_filename = None
-            if sub_task_crops:
-                first_crop  = sub_task_crops[0]
-                last_crop   = sub_task_crops[-1]
-                full_q_rect = pymupdf.Rect(
-                    first_crop.x0, first_crop.y0,
-                    first_crop.x1, last_crop.y1,
-                )
-                full_q_filename    = f"{menu.file_prefix}_{clean_q}.png"
-                full_q_output_path = os.path.join(output_folder, full_q_filename)
-                self.snipper.crop_and_save(page, full_q_rect, full_q_output_path)
-
-            if not has_any_letters:
-                if sub_task_crops and full_q_filename:
-                    self.exporter.add_row(
-                        year=menu.year, subject=menu.subject, paper=menu.paper,
-                        question_no=clean_q, part="", sub_part="",
-                        part_image_filename=full_q_filename,
-                        question_image_filename=full_q_filename, level=menu.level
+        # ------------------------------------------------------------------
+        # Build a "full question" image that spans ALL sub-task crops.
+        # ------------------------------------------------------------------
+        full_q_filename = None
+        if sub_task_crops:
+            # crop_and_save only needs the four coordinates -> plain tuple, no Rect
+            full_q_rect        = extractor.calculate_full_question_area(sub_task_crops)
+            full_q_filename    = f"{prefix}{ext}"
+            full_q_output_path = folder + full_q_filename
+            crops.append((full_q_rect, full_q_output_path))
+
+        if not has_any_letters:
+            if sub_task_crops and full_q_filename:
+                rows.append(dict(
+                    year=year, subject=subject, paper=paper,
+                    question_no=clean_q, part="", sub_part="",
+                    part_image_filename=full_q_filename,
+                    question_image_filename=full_q_filename, level=level
+                ))
+        else:
+            hierarchy = extractor.detect_hierarchy(page, sub_task_crops, labels=labels)
+            #print(f"  Question {clean_q}: detected hierarchy = {hierarchy}") 
+
+            if hierarchy == 'roman_first':
+                # --------------------------------------------------------
+                # Parent level = roman numeral (i, ii …)
+                # Child level  = letter (a, b …)
+                # Output pattern: {meta}_{Q}_i.a, {meta}_{Q}_i.b, {meta}_{Q}_ii.a …
+                #
+                # The roman label only appears at the START of its section.
+                # Subsequent crops (e.g. the (b) crop under (i)) won't contain
+                # the roman label at all, so we carry it forward with current_roman.
+                # --------------------------------------------------------
+                current_roman = None #
+
+                for sub_index, crop_rect in enumerate(sub_task_crops):
+                    found_roman = extractor.find_roman_label_for_crop(page, crop_rect, labels=labels)
+                    if found_roman:
+                        current_roman = found_roman
+
+                    # Only fall back to index if we have never seen a roman label yet
+                    roman_label = current_roman or _ROMAN_FALLBACK[sub_index % len(_ROMAN_FALLBACK)]
+
+                    letter_coords = extractor.find_letter_coordinates_for_crop(
+                        page, crop_rect, labels=labels
                     )
-            else:
-                hierarchy = self.extractor.detect_hierarchy(page, sub_task_crops)
-                #print(f"  Question {clean_q}: detected hierarchy = {hierarchy}") 
-
-                if hierarchy == 'roman_first':
-                    # --------------------------------------------------------
-                    # Parent level = roman numeral (i, ii …)
-                    # Child level  = letter (a, b …)
-                    # Output pattern: {meta}_{Q}_i.a, {meta}_{Q}_i.b, {meta}_{Q}_ii.a …
-                    #
-                    # The roman label only appears at the START of its section.
-                    # Subsequent crops (e.g. the (b) crop under (i)) won't contain
-                    # the roman label at all, so we carry it forward with current_roman.
-                    # --------------------------------------------------------
-                    current_roman = None #
-
-                    for sub_index, crop_rect in enumerate(sub_task_crops):
-                        found_roman = self.extractor.find_roman_label_for_crop(page, crop_rect)
-                        if found_roman:
-                            current_roman = found_roman
-
-                        # Only fall back to index if we have never seen a roman label yet
-                        roman_label = current_roman or _ROMAN_FALLBACK[sub_index % len(_ROMAN_FALLBACK)]
-
-                        letter_coords = self.extractor.find_letter_coordinates_for_crop(
-                            page, crop_rect
+
+                    if letter_coords:
+                        letter_crops = extractor.calculate_letter_crop_areas(
+                            letter_coords, crop_rect
                         )
+                        for letter_text, letter_crop in letter_crops:
+                            part_filename    = f"{prefix}_{roman_label}.{letter_text}{ext}"
+                            full_output_path = folder + part_filename
+                            crops.append((letter_crop, full_output_path))
 
-                        if letter_coords:
-                            letter_crops = self.extractor.calculate_letter_crop_areas(
-                                letter_coords, crop_rect
-                            )
-                            for letter_text, letter_crop in letter_crops:
-                                part_filename    = f"{menu.file_prefix}_{clean_q}_{roman_label}.{letter_text}.png"
-                                full_output_path = os.path.join(output_folder, part_filename)
-                                self.snipper.crop_and_save(page, letter_crop, full_output_path)
-
-                                self.exporter.add_row(
-                                    year=menu.year, subject=menu.subject, paper=menu.paper,
-                                    level=menu.level,
-                                    question_no=clean_q, part=roman_label, sub_part=letter_text,
-                                    part_image_filename=part_filename,
-                                    question_image_filename=full_q_filename or part_filename,
-                                )
-                        else:
-                            # Roman part with no letter children
-                            part_filename    = f"{menu.file_prefix}_{clean_q}_{roman_label}.png"
-                            full_output_path = os.path.join(output_folder, part_filename)
-                            self.snipper.crop_and_save(page, crop_rect, full_output_path)
-
-                            self.exporter.add_row(
-                                year=menu.year, subject=menu.subject, paper=menu.paper,
-                                level=menu.level,
-                                question_no=clean_q, part=roman_label, sub_part="",
+                            rows.append(dict(
+                                year=year, subject=subject, paper=paper,
+                                level=level,
+                                question_no=clean_q, part=roman_label, sub_part=letter_text,
                                 part_image_filename=part_filename,
                                 question_image_filename=full_q_filename or part_filename,
-                            )
-
-                else:
-                    # --------------------------------------------------------
-                    # Parent level = letter (a, b …)
-                    # Child level  = roman numeral (i, ii …)
-                    # Output pattern: {meta}_{Q}_a.i, {meta}_{Q}_a.ii, {meta}_{Q}_b …
-                    #
-                    # Same carry-forward logic: letter labels only appear at the
-                    # start of their section, so track current_letter across crops.
-                    # --------------------------------------------------------
-                    current_letter = None
-
-                    for sub_index, crop_rect in enumerate(sub_task_crops):
-                        found_letter = self.extractor.find_letter_label_for_crop(page, crop_rect)
-                        if found_letter:
-                            current_letter = found_letter
-
-                        letter_label = current_letter or alphabet[sub_index % 26]
-
-                        roman_coords = self.extractor.find_roman_numeral_coordinates(
-                            page, crop_rect
+                            ))
+                    else:
+                        # Roman part with no letter children
+                        part_filename    = f"{prefix}_{roman_label}{ext}"
+                        full_output_path = folder + part_filename
+                        crops.append((crop_rect, full_output_path))
+
+                        rows.append(dict(
+                            year=year, subject=subject, paper=paper,
+                            level=level,
+                            question_no=clean_q, part=roman_label, sub_part="",
+                            part_image_filename=part_filename,
+                            question_image_filename=full_q_filename or part_filename,
+                        ))
+
+            else:
+                # --------------------------------------------------------
+                # Parent level = letter (a, b …)
+                # Child level  = roman numeral (i, ii …)
+                # Output pattern: {meta}_{Q}_a.i, {meta}_{Q}_a.ii, {meta}_{Q}_b …
+                #
+                # Same carry-forward logic: letter labels only appear at the
+                # start of their section, so track current_letter across crops.
+                # --------------------------------------------------------
+                current_letter = None
+                has_romans     = bool(labels[1][0])
+
+                for sub_index, crop_rect in enumerate(sub_task_crops):
+                    # A crop without letter labels can't yield one -> skip the lookup
+                    found_letter = extractor.find_letter_label_for_crop(
+                        page, crop_rect, labels=labels
+                    ) if letter_flags[sub_index] else None
+                    if found_letter:
+                        current_letter = found_letter
+
+                    letter_label = current_letter or _fallback_letter(sub_index)
+
+                    # No (i)/(ii) label anywhere on the page -> every part is a single image
+                    roman_coords = extractor.find_roman_numeral_coordinates(
+                        page, crop_rect, labels=labels
+                    ) if has_romans else []
+
+                    if roman_coords:
+                        roman_crops = extractor.calculate_roman_crop_areas(
+                            roman_coords, crop_rect, page
                         )
+                        for roman_text, roman_crop in roman_crops:
+                            part_filename    = f"{prefix}_{letter_label}.{roman_text}{ext}"
+                            full_output_path = folder + part_filename
+                            crops.append((roman_crop, full_output_path))
 
-                        if roman_coords:
-                            roman_crops = self.extractor.calculate_roman_crop_areas(
-                                roman_coords, crop_rect, page
-                            )
-                            for roman_text, roman_crop in roman_crops:
-                                part_filename    = f"{menu.file_prefix}_{clean_q}_{letter_label}.{roman_text}.png"
-                                full_output_path = os.path.join(output_folder, part_filename)
-                                self.snipper.crop_and_save(page, roman_crop, full_output_path)
-
-                                self.exporter.add_row(
-                                    year=menu.year, subject=menu.subject, paper=menu.paper,
-                                    level=menu.level,
-                                    question_no=clean_q, part=letter_label, sub_part=roman_text,
-                                    part_image_filename=part_filename,
-                                    question_image_filename=full_q_filename or part_filename,
-                                )
-                        else:
-                            part_filename    = f"{menu.file_prefix}_{clean_q}_{letter_label}.png"
-                            full_output_path = os.path.join(output_folder, part_filename)
-                            self.snipper.crop_and_save(page, crop_rect, full_output_path)
-
-                            self.exporter.add_row(
-                                year=menu.year, subject=menu.subject, paper=menu.paper,
-                                level=menu.level,
-                                question_no=clean_q, part=letter_label, sub_part="",
+                            rows.append(dict(
+                                year=year, subject=subject, paper=paper,
+                                level=level,
+                                question_no=clean_q, part=letter_label, sub_part=roman_text,
                                 part_image_filename=part_filename,
                                 question_image_filename=full_q_filename or part_filename,
-                            )
+                            ))
+                    else:
+                        part_filename    = f"{prefix}_{letter_label}{ext}"
+                        full_output_path = folder + part_filename
+                        crops.append((crop_rect, full_output_path))
 
-        self.pdf_manager.close_pdf()
-        print(f"Finished processing: {pdf_path}")
+                        rows.append(dict(
+                            year=year, subject=subject, paper=paper,
+                            level=level,
+                            question_no=clean_q, part=letter_label, sub_part="",
+                            part_image_filename=part_filename,
+                            question_image_filename=full_q_filename or part_filename,
+                        ))
+
+        return crops, rows
@@ -0,0 +1,106 @@
+# batch_main.py
+import argparse
+import glob
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from factories import build_pipeline
+
+
+class BatchMenu:
+    """Same attributes as Menu, filled from the command line; the paper is the PDF's file name."""
+
+    def __init__(self, publisher, level, subject, year, paper, output_base):
+        self.publisher = publisher
+        self.level     = level
+        self.subject   = subject
+        self.year      = year
+        self.paper     = paper
+
+        # Paper in the prefix and one folder per PDF: papers of the same year must not overwrite each other
+        self.file_prefix = f"{self.publisher}_{self.level}_{self.subject}_{self.year}_{self.paper}"
+        self.folder_name = os.path.join(output_base, self.paper)
+
+
+def run_one(pdf_path, menu, output_format="png"):
+    """Process one PDF in its own worker process (own document, own pipeline)."""
+    # PDFs already run in parallel -> pages of this PDF run serially and are rendered
+    # right here: no nested page or render process pools inside a batch worker
+    processor = build_pipeline(max_workers=1, output_format=output_format, in_process_render=True)
+    processor.run(pdf_path, menu)
+
+    excel_path = os.path.join(menu.folder_name, f"{menu.paper}_questions.xlsx")
+    processor.exporter.save(excel_path)
+    return excel_path
+
+
+def print_progress(completed, total, pdf_path, error=None):
+    status = "FAILED" if error else "done"
+    print(f"[{completed}/{total}] {os.path.basename(pdf_path)}: {status}")
+
+
+def run_batch(pdf_paths, publisher, level, subject, year, output_base, max_workers=None,
+              output_format="png", progress=print_progress):
+    """
+    Run every PDF through its own TaskPipeline on a process pool.
+    A crash in one PDF is reported and does not stop the others.
+    Returns {pdf_path: error message} for the PDFs that failed.
+    """
+    failed = {}
+    total  = len(pdf_paths)
+    if not total:
+        return failed
+
+    workers = min(max_workers or os.cpu_count() or 1, total)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = {}
+        for pdf_path in pdf_paths:
+            paper = os.path.splitext(os.path.basename(pdf_path))[0]
+            menu  = BatchMenu(publisher, level, subject, year, paper, output_base)
+            futures[ex.submit(run_one, pdf_path, menu, output_format)] = pdf_path
+
+        for completed, future in enumerate(as_completed(futures), start=1):
+            pdf_path = futures[future]
+            error    = None
+            try:
+                future.result()
+            except Exception as e:       # includes a worker process that died (BrokenProcessPool)
+                error = f"{type(e).__name__}: {e}"
+                failed[pdf_path] = error
+                traceback.print_exception(e)
+            progress(completed, total, pdf_path, error)
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop the questions of every PDF in a folder.")
+    parser.add_argument("--dir", required=True, help="folder with the question paper PDFs")
+    parser.add_argument("--publisher", required=True)
+    parser.add_argument("--level", required=True)
+    parser.add_argument("--subject", required=True)
+    parser.add_argument("--year", required=True)
+    parser.add_argument("--out", help="output folder (default: {publisher}_{subject}_{year})")
+    parser.add_argument("--workers", type=int, help="PDFs processed at once (default: CPU count)")
+    parser.add_argument("--format", default="png", choices=["png", "jpg"],
+                        help="image format: png, or jpg for smaller files on colour pages")
+    args = parser.parse_args()
+
+    pdf_paths   = sorted(glob.glob(os.path.join(args.dir, "*.pdf")))
+    output_base = args.out or f"{args.publisher}_{args.subject}_{args.year}"
+    print(f"Found {len(pdf_paths)} PDFs in {args.dir}, output: {output_base}/")
+
+    failed = run_batch(
+        pdf_paths, args.publisher, args.level, args.subject, args.year,
+        output_base, max_workers=args.workers, output_format=args.format,
+    )
+
+    print(f"\nFinished: {len(pdf_paths) - len(failed)}/{len(pdf_paths)} PDFs processed")
+    if failed:
+        print("Failed files:")
+        for pdf_path, error in failed.items():
+            print(f"  {pdf_path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# factories.py
+# Builds the PDFManager -> TaskExtractor -> ImageSnipper -> ExcelExporter graph in one place,
+# shared by main.py and batch_main.py.
+from PDFManager import PDFManager
+from TaskExtractor import TaskExtractor
+from ImageSnipper import ImageSnipper
+from TaskPipeline import TaskPipeline
+from ExcelExporter import ExcelExporter
+
+
+def build_pipeline(max_workers=None, snipper_workers=None, output_format="png", in_process_render=False):
+    """
+    Return a ready TaskPipeline with fresh components.
+    max_workers: page worker processes (1 = serial); snipper_workers: render processes.
+    in_process_render: render in this process instead of a render pool (batch workers).
+    The exporter is reachable as pipeline.exporter for saving the Excel file.
+    """
+    return TaskPipeline(
+        PDFManager(),
+        TaskExtractor(),
+        ImageSnipper(max_workers=snipper_workers, output_format=output_format, in_process=in_process_render),
+        ExcelExporter(),
+        max_workers=max_workers,
+    )
@@ -1,33 +1,40 @@
 # main.py
-import pymupdf
+import argparse
 import os
-import string 
-import pytesseract 
-from PIL import Image
-# Below are the imports for the classes 
-from PDFManager import PDFManager
-from TaskExtractor import TaskExtractor
-from ImageSnipper import ImageSnipper
+# Below are the imports for the classes
 from Menu import Menu 
-from TaskPipeline import TaskPipeline
-from ExcelExporter import ExcelExporter
+from factories import build_pipeline
+
 
 def main():
-    menu      = Menu()
-    pdf_manager = PDFManager()
-    extractor   = TaskExtractor()
-    snipper     = ImageSnipper()
-    exporter    = ExcelExporter()                
+    parser = argparse.ArgumentParser(description="Crop the questions of an exam paper PDF.")
+    parser.add_argument("--pdf", default=r"C:\Dev\src\9fm0-02-que-20230606.pdf", help="question paper PDF")
+    parser.add_argument("--out", help="output folder (default: {publisher}_{subject}_{year})")
+    parser.add_argument("--batch-dir", help="process every PDF in this folder instead of --pdf (see batch_main.py)")
+    parser.add_argument("--format", default="png", choices=["png", "jpg"],
+                        help="image format: png, or jpg for smaller files on colour pages")
+    args = parser.parse_args()
+
+    menu = Menu()
+    if args.out:
+        menu.folder_name = args.out
 
-    processor = TaskPipeline(pdf_manager, extractor, snipper, exporter)  
+    if args.batch_dir:
+        import glob
+        from batch_main import run_batch
+        pdf_paths = sorted(glob.glob(os.path.join(args.batch_dir, "*.pdf")))
+        failed    = run_batch(pdf_paths, menu.publisher, menu.level, menu.subject, menu.year, menu.folder_name,
+                              output_format=args.format)
+        print(f"\nFinished: {len(pdf_paths) - len(failed)}/{len(pdf_paths)} PDFs processed")
+        return
 
-    pdf_path = r"C:\Dev\src\9fm0-02-que-20230606.pdf"  # update as needed
-    processor.run(pdf_path, menu)
+    processor = build_pipeline(output_format=args.format)
+    processor.run(args.pdf, menu)
 
     # Save Excel file next to the output folder
-    excel_filename = f"{menu.folder_name}_questions.xlsx"
+    excel_filename = f"{os.path.basename(os.path.normpath(menu.folder_name))}_questions.xlsx"
     excel_path     = os.path.join(menu.folder_name, excel_filename)
-    exporter.save(excel_path)                    
+    processor.exporter.save(excel_path)                    
 
 if __name__ == "__main__":
     main()